@@ -0,0 +1,368 @@
+"""出席履歴の配列による保存と分析（NumPy が必要）
+
+授業×授業回の出席状況を int8 の2次元配列（行=授業のスナップショット、列=第1〜26回）に、
+アカウント・学期・授業名・曜日・時限・取得時刻を構造化配列に持ち、.npy として保存する
+（読み込みは np.load(mmap_mode="r") なので、数万件でもすぐに開ける）。
+実行・学期・アカウントをまたいで追記し、分析は同じ授業の最新のスナップショットだけを使う。
+
+    python main.py --history history                   # 実行ごとに追記（アカウント名はセッションファイル名）
+    python analytics.py build --history history --accounts accounts.json   # 保存済みデータから作る
+    python analytics.py report --history history --term 2026年度後期
+
+分析は全て配列演算で行う：
+  - 欠席の見込み：授業ごとに、これまでの欠席率で残りの回（13回／通年は学期ごとの13回）を
+    欠席した場合の欠席数と、上限（既定は授業回数の1/3）までの残り
+  - 曜日×時限ごとの欠席率
+  - アカウントごとの出席率の順位（一括取得した複数アカウントの比較）
+
+history/
+    statuses.npy  (N, 26) int8   -1=回なし, 0=未実施, 1=出席, 2=欠席
+    meta.npy      (N,) 構造化配列（account, term, subject, weekday, period, lessons, second_semester, fetched_at）
+    tables.json   アカウント名・学期名・授業名の一覧（meta の番号→文字列）
+"""
+import argparse
+import json
+import os
+import time
+
+import render
+from atomic_file import atomic_write
+from attendance_store import AttendanceStore, STORE_FILE, WEEKDAYS, parse_day_and_period
+
+# NumPy は分析する場合のみ読み込む（import_numpy を参照）
+np = None
+
+# 保存先のディレクトリ
+HISTORY_DIR = "history"
+
+# 授業回の列数（通年授業の26回）と、1学期分の回数
+MAX_LESSONS = 26
+TERM_LESSONS = 13
+
+# 出席状況 → 配列の値（それ以外は未実施）
+NO_LESSON = -1
+UNIMPLEMENTED = 0
+STATUS_CODES = {"出席": 1, "欠席": 2}
+ATTENDED = STATUS_CODES["出席"]
+ABSENT = STATUS_CODES["欠席"]
+
+# 欠席の上限（授業回数に対する割合）
+DEFAULT_LIMIT_RATIO = 1 / 3
+
+META_FIELDS = [
+    ("account", "i4"),
+    ("term", "i4"),
+    ("subject", "i4"),
+    ("weekday", "i1"),       # 0=月 … 6=日、-1=なし
+    ("period", "i1"),        # 1〜、-1=なし
+    ("lessons", "i1"),       # 授業回数（13 または 26）
+    ("second_semester", "?"),
+    ("fetched_at", "f8"),
+]
+
+WEEKDAY_NAMES = sorted(WEEKDAYS, key=WEEKDAYS.get)
+
+
+def import_numpy():
+    """NumPy を読み込む（未インストールでも main.py 等は使えるようにするため遅延させる）"""
+    global np
+    if np is None:
+        try:
+            import numpy as _np
+        except ImportError:
+            raise SystemExit("❌ 分析には NumPy が必要です: pip install numpy")
+        np = _np
+
+
+class AttendanceHistory:
+    """授業のスナップショットの配列と、番号→文字列の表"""
+
+    def __init__(self, statuses, meta, accounts, terms, subjects):
+        self.statuses = statuses
+        self.meta = meta
+        self.accounts = accounts
+        self.terms = terms
+        self.subjects = subjects
+        self._lookup = {name: {value: i for i, value in enumerate(table)}
+                        for name, table in (("accounts", accounts), ("terms", terms), ("subjects", subjects))}
+
+    def __len__(self):
+        return len(self.meta)
+
+    @classmethod
+    def empty(cls):
+        import_numpy()
+        return cls(np.empty((0, MAX_LESSONS), dtype=np.int8), np.empty(0, dtype=META_FIELDS), [], [], [])
+
+    @classmethod
+    def load(cls, path=HISTORY_DIR, mmap=True):
+        """保存済みの履歴を読み込む（なければ空）。mmap=True なら配列はファイルに対応付けるだけ"""
+        import_numpy()
+        tables_path = os.path.join(path, "tables.json")
+        if not os.path.exists(tables_path):
+            return cls.empty()
+        with open(tables_path, "r") as f:
+            tables = json.load(f)
+        mode = "r" if mmap else None
+        return cls(np.load(os.path.join(path, "statuses.npy"), mmap_mode=mode),
+                   np.load(os.path.join(path, "meta.npy"), mmap_mode=mode),
+                   tables["accounts"], tables["terms"], tables["subjects"])
+
+    def save(self, path=HISTORY_DIR):
+        os.makedirs(path, exist_ok=True)
+        with atomic_write(os.path.join(path, "statuses.npy"), "wb") as f:
+            np.save(f, np.asarray(self.statuses))
+        with atomic_write(os.path.join(path, "meta.npy"), "wb") as f:
+            np.save(f, np.asarray(self.meta))
+        with atomic_write(os.path.join(path, "tables.json"), encoding="utf-8") as f:
+            json.dump({"accounts": self.accounts, "terms": self.terms, "subjects": self.subjects}, f,
+                      ensure_ascii=False)
+
+    def _code(self, name, value):
+        lookup = self._lookup[name]
+        if value not in lookup:
+            lookup[value] = len(lookup)
+            getattr(self, name).append(value)
+        return lookup[value]
+
+    def append(self, records, account, fetched_at=None):
+        """出席情報（render.as_record の形式の辞書）を1件ずつ追記する"""
+        records = list(records)
+        if not records:
+            return
+        statuses = np.full((len(records), MAX_LESSONS), NO_LESSON, dtype=np.int8)
+        meta = np.zeros(len(records), dtype=META_FIELDS)
+        account_code = self._code("accounts", account)
+        for i, record in enumerate(records):
+            for lesson in record["lessons"]:
+                if 1 <= lesson["number"] <= MAX_LESSONS:
+                    statuses[i, lesson["number"] - 1] = STATUS_CODES.get(lesson["status"], UNIMPLEMENTED)
+            slot = parse_day_and_period(record["day_and_period"]) or (-1, -1)
+            meta[i] = (account_code, self._code("terms", record["semester"]), self._code("subjects", record["subject"]),
+                       slot[0], slot[1], min(len(record["lessons"]), MAX_LESSONS),
+                       "後期" in record["semester"], record.get("fetched_at") or fetched_at or time.time())
+        self.statuses = np.concatenate([np.asarray(self.statuses), statuses])
+        self.meta = np.concatenate([np.asarray(self.meta), meta])
+
+    def latest(self, term=None, account=None):
+        """(アカウント, 学期, 授業) ごとの最新のスナップショットの行番号
+
+        term を指定すると学期名が term で始まるもの、account を指定するとそのアカウントだけに絞る。
+        """
+        meta = self.meta
+        if len(meta) == 0:
+            return np.empty(0, dtype=np.intp)
+        order = np.lexsort((meta["fetched_at"], meta["subject"], meta["term"], meta["account"]))
+        keys = np.stack([meta["account"][order], meta["term"][order], meta["subject"][order]], axis=1)
+        # 並べ替えた後、次の行と (アカウント, 学期, 授業) が異なる行がその組の最新
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = np.any(keys[1:] != keys[:-1], axis=1)
+        rows = order[last]
+        if term:
+            terms = np.array([name.startswith(term) for name in self.terms], dtype=bool)
+            rows = rows[terms[meta["term"][rows]]]
+        if account is not None:
+            code = self._lookup["accounts"].get(account, -1)
+            rows = rows[meta["account"][rows] == code]
+        return rows
+
+    def window(self, rows):
+        """rows の各授業で、その学期に集計する授業回の列（通年授業は前期1-13回・後期14-26回）"""
+        lessons = self.meta["lessons"][rows].astype(np.int16)
+        second = self.meta["second_semester"][rows]
+        full_year = lessons > TERM_LESSONS
+        start = np.where(full_year & second, TERM_LESSONS, 0)
+        end = np.where(full_year, np.where(second, lessons, TERM_LESSONS), lessons)
+        columns = np.arange(MAX_LESSONS)
+        return (columns >= start[:, None]) & (columns < end[:, None])
+
+
+# ---------------------------------------------------------------------------
+# 分析
+# ---------------------------------------------------------------------------
+
+def absence_projection(history, rows, limit_ratio=DEFAULT_LIMIT_RATIO):
+    """授業ごとの欠席の見込み（配列の辞書。どの配列も rows と同じ順）
+
+    held=実施済み、absent=欠席、remaining=残りの回、projected=これまでの欠席率で残りを
+    受けた場合の欠席数、limit=欠席の上限、margin=上限まであと何回欠席できるか。
+    """
+    window = history.window(rows)
+    statuses = np.asarray(history.statuses[rows])
+    absent = ((statuses == ABSENT) & window).sum(axis=1)
+    held = (((statuses == ATTENDED) | (statuses == ABSENT)) & window).sum(axis=1)
+    total = window.sum(axis=1)
+    remaining = total - held
+    rate = np.divide(absent, held, out=np.zeros(len(rows)), where=held > 0)
+    limit = np.floor(total * limit_ratio).astype(np.int64)
+    return {
+        "rows": rows,
+        "held": held,
+        "absent": absent,
+        "total": total,
+        "remaining": remaining,
+        "projected": absent + rate * remaining,
+        "limit": limit,
+        "margin": limit - absent,
+    }
+
+
+def absence_heatmap(history, rows):
+    """曜日×時限ごとの (欠席数, 実施数) の2次元配列（曜日・時限のない授業は除く）"""
+    window = history.window(rows)
+    statuses = np.asarray(history.statuses[rows])
+    absent = ((statuses == ABSENT) & window).sum(axis=1)
+    held = (((statuses == ATTENDED) | (statuses == ABSENT)) & window).sum(axis=1)
+    weekday = history.meta["weekday"][rows].astype(np.intp)
+    period = history.meta["period"][rows].astype(np.intp)
+    has_slot = (weekday >= 0) & (period >= 1)
+    periods = max(int(period.max(initial=0)), 1)
+    absent_grid = np.zeros((len(WEEKDAY_NAMES), periods), dtype=np.int64)
+    held_grid = np.zeros_like(absent_grid)
+    np.add.at(absent_grid, (weekday[has_slot], period[has_slot] - 1), absent[has_slot])
+    np.add.at(held_grid, (weekday[has_slot], period[has_slot] - 1), held[has_slot])
+    return absent_grid, held_grid
+
+
+def cohort_ranking(history, rows):
+    """アカウントごとの (アカウント番号, 出席数, 実施数, 出席率) を出席率の高い順に返す"""
+    window = history.window(rows)
+    statuses = np.asarray(history.statuses[rows])
+    attended = ((statuses == ATTENDED) & window).sum(axis=1)
+    held = (((statuses == ATTENDED) | (statuses == ABSENT)) & window).sum(axis=1)
+    accounts = history.meta["account"][rows]
+    size = len(history.accounts)
+    attended_total = np.bincount(accounts, weights=attended, minlength=size)
+    held_total = np.bincount(accounts, weights=held, minlength=size)
+    rate = np.divide(attended_total, held_total, out=np.zeros(size), where=held_total > 0)
+    present = np.bincount(accounts, minlength=size) > 0
+    order = np.lexsort((-held_total, -rate))
+    return [(int(i), int(attended_total[i]), int(held_total[i]), float(rate[i])) for i in order if present[i]]
+
+
+# ---------------------------------------------------------------------------
+# 表示
+# ---------------------------------------------------------------------------
+
+def pad(text, width):
+    """表示幅 width になるまで空白を足す（全角=2）"""
+    return text + " " * max(0, width - render.display_width(text))
+
+
+def print_projection(history, projection, limit=20):
+    """上限までの残りが少ない授業から表示する"""
+    order = np.lexsort((-projection["projected"], projection["margin"]))[:limit]
+    print("\n" + "=" * 100)
+    print("⚠️ 欠席の見込み（上限までの残りが少ない順）")
+    print("=" * 100)
+    print(pad("授業名", 28) + pad("学期", 18) + " 欠席 実施 残り  見込み 上限 あと    アカウント")
+    print("-" * 100)
+    for i in order:
+        row = projection["rows"][i]
+        meta = history.meta[row]
+        name = pad(render.truncate(history.subjects[meta["subject"]], 30), 28)
+        term = pad(history.terms[meta["term"]], 18)
+        mark = "🔴" if projection["margin"][i] < 0 or projection["projected"][i] > projection["limit"][i] else "  "
+        print(f"{name}{term}{projection['absent'][i]:>5}{projection['held'][i]:>5}{projection['remaining'][i]:>5}"
+              f"{projection['projected'][i]:>8.1f}{projection['limit'][i]:>5}{projection['margin'][i]:>5} {mark} "
+              f"{history.accounts[meta['account']]}")
+
+
+def print_heatmap(absent_grid, held_grid):
+    rate = np.divide(absent_grid, held_grid, out=np.full(absent_grid.shape, np.nan), where=held_grid > 0)
+    print("\n" + "=" * 60)
+    print("🗓️ 曜日×時限ごとの欠席率（欠席/実施）")
+    print("=" * 60)
+    print("    " + "".join(f"{p + 1:>6}限" for p in range(rate.shape[1])))
+    for weekday, name in enumerate(WEEKDAY_NAMES):
+        if not held_grid[weekday].any():
+            continue
+        cells = "".join("      ― " if np.isnan(value) else f"{value * 100:>7.0f}%" for value in rate[weekday])
+        print(f"{name}  {cells}")
+
+
+def print_ranking(history, ranking, limit=20):
+    print("\n" + "=" * 60)
+    print(f"🏆 アカウント別の出席率（{len(ranking)}件）")
+    print("=" * 60)
+    for place, (account, attended, held, rate) in enumerate(ranking[:limit], start=1):
+        print(f"{place:>3}. {history.accounts[account]:<20} {rate * 100:>5.1f}% （{attended}/{held}回）")
+
+
+# ---------------------------------------------------------------------------
+# 履歴への追記
+# ---------------------------------------------------------------------------
+
+def append_run(path, results, account):
+    """1回の実行の出席情報（SubjectAttendance のリスト）を履歴に追記する"""
+    history = AttendanceHistory.load(path, mmap=False)
+    history.append((render.as_record(data) for data in results), account)
+    history.save(path)
+    return history
+
+
+def records_from_store(store_path):
+    """保存済みの出席情報（attendance_store）を render.as_record と同じ形式で返す"""
+    records = []
+    with AttendanceStore(store_path) as store:
+        for semester, subject, day_and_period in store.subjects():
+            attendance_data = store.load(semester, subject) or []
+            records.append({
+                "semester": semester,
+                "subject": subject,
+                "day_and_period": day_and_period,
+                "lessons": [{"number": int(data['lesson']), "status": data['status']} for data in attendance_data],
+                "fetched_at": store.fetched_at(semester, subject),
+            })
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OECU 出席履歴の分析（NumPy が必要）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="保存済みの出席情報（SQLite）から履歴に追記する")
+    build.add_argument("--history", default=HISTORY_DIR, help="履歴の保存先")
+    build.add_argument("--store", default=STORE_FILE, help="出席情報の保存先（--accounts を指定しない場合）")
+    build.add_argument("--account", default="me", help="--store のアカウント名")
+    build.add_argument("--accounts", default=None, help="batch.py と同じアカウント一覧（各アカウントの保存先を読む）")
+
+    report = subparsers.add_parser("report", help="欠席の見込み・曜日×時限の欠席率・アカウント別の順位を表示する")
+    report.add_argument("--history", default=HISTORY_DIR, help="履歴の保存先")
+    report.add_argument("--term", default=None, help="対象の学期（前方一致。例: 2026年度後期）")
+    report.add_argument("--account", default=None, help="欠席の見込みと曜日×時限を表示するアカウント")
+    report.add_argument("--limit-ratio", type=float, default=DEFAULT_LIMIT_RATIO,
+                        help="欠席の上限（授業回数に対する割合）")
+    report.add_argument("--top", type=int, default=20, help="表示する件数")
+    args = parser.parse_args()
+
+    import_numpy()
+    if args.command == "build":
+        history = AttendanceHistory.load(args.history, mmap=False)
+        before = len(history)
+        if args.accounts:
+            from batch import load_accounts
+            sources = [(account["name"], account["store"]) for account in load_accounts(args.accounts)]
+        else:
+            sources = [(args.account, args.store)]
+        for name, store_path in sources:
+            if not os.path.exists(store_path):
+                print(f"⚠️ {name}: {store_path} がありません")
+                continue
+            history.append(records_from_store(store_path), name)
+        history.save(args.history)
+        print(f"✅ 履歴に{len(history) - before}件を追記しました（合計{len(history)}件）: {args.history}")
+    else:
+        started = time.perf_counter()
+        history = AttendanceHistory.load(args.history)
+        if not len(history):
+            print(f"❌ {args.history} に履歴がありません")
+            exit(1)
+        cohort_rows = history.latest(args.term)
+        rows = cohort_rows if args.account is None else history.latest(args.term, args.account)
+        print(f"📚 {len(rows)}件の授業を分析します（履歴{len(history)}件・{len(history.accounts)}アカウント）")
+        print_projection(history, absence_projection(history, rows, args.limit_ratio), args.top)
+        print_heatmap(*absence_heatmap(history, rows))
+        if len(history.accounts) > 1:
+            print_ranking(history, cohort_ranking(history, cohort_rows), args.top)
+        print(f"\n⏱️ 分析 {time.perf_counter() - started:.3f}秒")
@@ -0,0 +1,114 @@
+"""取得したHTMLの保存（--archive）と再現（--replay）
+
+list.xhtml と授業ページのHTMLを、内容のSHA-256をキーにgzip圧縮して保存する
+（同じ内容のページは1回だけ保存される）。ページごとに変わるJSFのViewStateは空にしてから保存する。実行ごとに、どのページをどの授業として
+取得したかを runs/<実行ID>.json に記録し、--replay ではポータルに接続せずに
+portal_http の解析と表示だけをやり直す。
+
+    archive/
+        objects/ab/cdef....html.gz
+        runs/20261017T101500.json
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+from atomic_file import atomic_write
+
+# 保存先のディレクトリ
+ARCHIVE_DIR = "archive"
+
+# ViewState の input 要素（値は取得のたびに変わり、再現には不要）
+VIEW_STATE_INPUT = re.compile(r'<input[^>]*javax\.faces\.ViewState[^>]*>')
+VALUE_ATTR = re.compile(r'value="[^"]*"')
+
+
+def strip_view_state(html):
+    """ViewState の値を空にする（同じ内容のページが同じキーになるように）"""
+    return VIEW_STATE_INPUT.sub(lambda m: VALUE_ATTR.sub('value=""', m.group(0)), html)
+
+
+class HtmlArchive:
+    """内容アドレス方式のHTML保存先と、実行ごとの記録"""
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.run = None
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:] + ".html.gz")
+
+    def put(self, html):
+        """HTMLを保存してキー（SHA-256）を返す。同じ内容が保存済みなら書き込まない"""
+        data = strip_view_state(html).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_write(path, "wb") as f:
+                f.write(gzip.compress(data))
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self._object_path(digest), "rb") as f:
+            return f.read().decode("utf-8")
+
+    # 実行ごとの記録 --------------------------------------------------------
+
+    def start_run(self):
+        self.run = {
+            "id": datetime.now().strftime("%Y%m%dT%H%M%S"),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "list_url": None,
+            "list": None,
+            "subjects": {},  # buttonId → HTMLのキー
+        }
+
+    def record_list(self, html, url):
+        if self.run is None:
+            self.start_run()
+        self.run["list_url"] = url
+        self.run["list"] = self.put(html)
+
+    def record_subject(self, button_id, html):
+        if self.run is None:
+            self.start_run()
+        self.run["subjects"][button_id] = self.put(html)
+
+    def save_run(self):
+        """実行の記録を保存してパスを返す（何も記録していなければ None）"""
+        if self.run is None or self.run["list"] is None:
+            return None
+        path = os.path.join(self.root, "runs", self.run["id"] + ".json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        suffix = 1
+        while os.path.exists(path):  # 同じ秒に複数回実行した場合
+            suffix += 1
+            path = os.path.join(self.root, "runs", f"{self.run['id']}-{suffix}.json")
+        self.run["id"] = os.path.basename(path)[:-len(".json")]
+        with open(path, "w") as f:
+            json.dump(self.run, f, ensure_ascii=False, indent=2)
+        self.run = None
+        return path
+
+    def runs(self):
+        """保存済みの実行ID（古い順）"""
+        runs_dir = os.path.join(self.root, "runs")
+        if not os.path.isdir(runs_dir):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(runs_dir) if name.endswith(".json"))
+
+    def load_run(self, run_id="latest"):
+        """実行の記録を読み込む（"latest" なら最新）。なければ KeyError"""
+        runs = self.runs()
+        if run_id == "latest":
+            if not runs:
+                raise KeyError(f"{self.root} に保存済みの実行がありません")
+            run_id = runs[-1]
+        if run_id not in runs:
+            raise KeyError(f"実行 {run_id} が見つかりません（保存済み: {', '.join(runs) or 'なし'}）")
+        with open(os.path.join(self.root, "runs", run_id + ".json"), "r") as f:
+            return json.load(f)
@@ -0,0 +1,184 @@
+"""ポータルの静的ファイル（JSF/PrimeFaces のスクリプト・CSS・画像等）のディスクキャッシュ（--asset-cache）
+
+context.route でスクリプト・CSS・フォント・画像の GET を受け取り、保存済みで新しければ
+ディスクから返す。期限切れなら ETag / Last-Modified で再検証し（304 ならディスクから返す）、
+保存していなければ取得して保存する。ページ本体（HTML）や POST はそのまま通す。
+合計サイズが上限を超えたら、最後に使ってから時間の経ったものから削除する（LRU）。
+
+ResourceBlocker 等、他の route と併用する場合はこのキャッシュを先に attach する
+（Playwright は後から登録した route から呼ぶので、遮断の判断が先に行われ、
+通過したリクエストだけが route.fallback でここに来る）。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+from atomic_file import atomic_write
+
+# 保存先のディレクトリ
+ASSET_CACHE_DIR = "asset_cache"
+
+# 合計サイズの上限（バイト）
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# キャッシュするリソース種別（Playwright の request.resource_type）
+CACHEABLE_TYPES = {"script", "stylesheet", "font", "image"}
+
+# 保存して返すレスポンスヘッダー（本文は展開済みなので Content-Encoding 等は除く）。
+# 別オリジンのフォントや crossorigin 付きのスクリプトは CORS のヘッダーがないとブラウザに拒否されるので残す
+KEPT_HEADERS = ("content-type", "cache-control", "etag", "last-modified", "expires", "vary",
+                "access-control-allow-origin", "access-control-allow-credentials",
+                "access-control-expose-headers", "cross-origin-resource-policy", "timing-allow-origin")
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def freshness_lifetime(headers):
+    """Cache-Control の max-age（秒）。no-cache なら 0、指定がなければ None"""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control:
+        return 0
+    match = MAX_AGE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+
+def kept_headers(response):
+    """レスポンスヘッダーのうち保存するもの（名前は小文字）"""
+    return {name.lower(): value for name, value in response.headers.items() if name.lower() in KEPT_HEADERS}
+
+
+class AssetCache:
+    """URL ごとに本文と検証子（ETag / Last-Modified）を保存するキャッシュ"""
+
+    def __init__(self, root=ASSET_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self.entries = self._load_index()  # キー → {url, status, headers, size, stored_at, max_age, used_at}
+        self.stats = {"hits": 0, "revalidated": 0, "stored": 0, "passed": 0, "saved_bytes": 0}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.root, "objects", key[:2], key[2:])
+
+    # route ----------------------------------------------------------------
+
+    def attach(self, context):
+        context.route("**/*", self._handle)
+
+    def _handle(self, route):
+        request = route.request
+        if request.method != "GET" or request.resource_type not in CACHEABLE_TYPES:
+            self.stats["passed"] += 1
+            route.fallback()
+            return
+        key = self.key(request.url)
+        entry = self.entries.get(key)
+        body = self._read_body(key) if entry else None
+        if body is None:
+            entry = None
+
+        if entry is not None and self._is_fresh(entry):
+            self._serve(route, entry, body)
+            self.stats["hits"] += 1
+            return
+
+        headers = dict(request.headers)
+        if entry is not None:
+            if entry["headers"].get("etag"):
+                headers["if-none-match"] = entry["headers"]["etag"]
+            if entry["headers"].get("last-modified"):
+                headers["if-modified-since"] = entry["headers"]["last-modified"]
+        try:
+            response = route.fetch(headers=headers)
+        except Exception:
+            # 取得できない場合は古くても保存済みのものを返す
+            if entry is not None:
+                self._serve(route, entry, body)
+            else:
+                route.fallback()
+            return
+
+        if response.status == 304 and entry is not None:
+            entry["stored_at"] = time.time()
+            entry["headers"].update(kept_headers(response))
+            self._serve(route, entry, body)
+            self.stats["revalidated"] += 1
+            return
+        if response.status == 200:
+            self._store(key, request.url, response)
+        route.fulfill(response=response)
+
+    def _is_fresh(self, entry):
+        return entry["max_age"] is not None and time.time() - entry["stored_at"] < entry["max_age"]
+
+    def _serve(self, route, entry, body):
+        entry["used_at"] = time.time()
+        self.stats["saved_bytes"] += entry["size"]
+        route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+
+    # 保存 -----------------------------------------------------------------
+
+    def _read_body(self, key):
+        try:
+            with open(self._body_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store(self, key, url, response):
+        headers = kept_headers(response)
+        if "no-store" in headers.get("cache-control", "").lower():
+            return
+        max_age = freshness_lifetime(headers)
+        if max_age is None and not (headers.get("etag") or headers.get("last-modified")):
+            return  # 新しさも再検証もできないものは保存しない
+        body = response.body()
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path, "wb") as f:
+            f.write(body)
+        now = time.time()
+        self.entries[key] = {"url": url, "status": 200, "headers": headers, "size": len(body),
+                             "stored_at": now, "max_age": max_age, "used_at": now}
+        self.stats["stored"] += 1
+
+    def evict(self):
+        """合計サイズが上限を超えていれば、最後に使った時刻の古いものから削除する。削除した件数を返す"""
+        total = sum(entry["size"] for entry in self.entries.values())
+        removed = 0
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used_at"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self._body_path(key))
+            except OSError:
+                pass
+            total -= entry["size"]
+            del self.entries[key]
+            removed += 1
+        return removed
+
+    def save(self):
+        """上限を超えた分を削除して索引を保存する（実行の終わりに呼ぶ）"""
+        self.evict()
+        os.makedirs(self.root, exist_ok=True)
+        with atomic_write(self.index_path) as f:
+            json.dump(self.entries, f)
+
+    def report(self):
+        stats = self.stats
+        print(f"📦 アセットキャッシュ: ディスクから{stats['hits']}件 / 再検証{stats['revalidated']}件 / "
+              f"新規保存{stats['stored']}件（約{stats['saved_bytes'] / 1024:.1f}KBの転送を省略）")
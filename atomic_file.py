@@ -0,0 +1,34 @@
+"""ファイルの置き換えによる保存
+
+同じディレクトリの一時ファイルに書いてから os.replace で置き換えるので、書き込み中に
+中断した場合や、複数のプロセス（batch.py のワーカー等）が同じファイルに書いた場合も、
+読み込む側には書き込みの終わったどれか1つの内容だけが見える。
+
+    with atomic_write("latency_stats.json") as f:
+        json.dump(samples, f)
+"""
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", sync=False, **kwargs):
+    """path に置き換えるための一時ファイルを開く
+
+    with を抜けると path に置き換え、例外が起きた場合は一時ファイルを削除して path は元のまま残す。
+    sync=True なら置き換える前にディスクに書き込む（session.json 等、失うと困るもの）。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + "-", dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,150 @@
+"""取得した出席情報のローカル保存（SQLite）
+
+学期・授業名・授業回をキーに出席状況を保存し、差分取得（--incremental）で
+「前回の取得以降に授業時間が終わった授業」または「保存から一定時間が経った授業」
+だけを取得し直すための判定を行う。過去の学期（--backfill で取得したもの）は
+--term でここから読み出す。
+"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# 保存先のファイル
+STORE_FILE = "attendance.db"
+
+# 時限ごとの終了時刻（時, 分）
+PERIOD_END_TIMES = {
+    1: (10, 30),
+    2: (12, 10),
+    3: (14, 30),
+    4: (16, 10),
+    5: (17, 50),
+    6: (19, 30),
+    7: (21, 10),
+}
+
+# 授業終了からポータルに反映されるまでの猶予
+SLOT_GRACE = timedelta(minutes=10)
+
+# 曜日の文字 → datetime.weekday()
+WEEKDAYS = {'月': 0, '火': 1, '水': 2, '木': 3, '金': 4, '土': 5, '日': 6}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    semester TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    day_and_period TEXT NOT NULL DEFAULT '',
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (semester, subject)
+);
+CREATE TABLE IF NOT EXISTS attendance (
+    semester TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    lesson TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (semester, subject, lesson)
+);
+"""
+
+
+def parse_day_and_period(day_and_period):
+    """「月2」→ (0, 2)。曜日・時限がない場合は None"""
+    if not day_and_period or day_and_period[0] not in WEEKDAYS:
+        return None
+    try:
+        return WEEKDAYS[day_and_period[0]], int(day_and_period[1:])
+    except ValueError:
+        return None
+
+
+def last_slot_end(day_and_period, now, grace=SLOT_GRACE):
+    """now 以前で最も新しい授業終了時刻（猶予込み）。曜日・時限がなければ None"""
+    slot = parse_day_and_period(day_and_period)
+    if slot is None or slot[1] not in PERIOD_END_TIMES:
+        return None
+    weekday, period = slot
+    hour, minute = PERIOD_END_TIMES[period]
+    end = now.replace(hour=hour, minute=minute, second=0, microsecond=0) + grace
+    end -= timedelta(days=(now.weekday() - weekday) % 7)
+    if end > now:
+        end -= timedelta(days=7)
+    return end
+
+
+def next_slot_end(day_and_period, now, grace=SLOT_GRACE):
+    """now より後で最も近い授業終了時刻（猶予込み）。曜日・時限がなければ None"""
+    end = last_slot_end(day_and_period, now, grace)
+    return None if end is None else end + timedelta(days=7)
+
+
+def is_due(day_and_period, fetched_at, now=None, ttl=None, grace=SLOT_GRACE):
+    """保存済みデータを取得し直す必要があるか
+
+    前回の取得以降に授業時間が終わっている、または保存から ttl 以上経っている場合に True。
+    """
+    if fetched_at is None:
+        return True
+    now = now or datetime.now()
+    fetched = datetime.fromtimestamp(fetched_at)
+    if ttl is not None and now - fetched >= ttl:
+        return True
+    slot_end = last_slot_end(day_and_period, now, grace)
+    return slot_end is not None and fetched < slot_end
+
+
+class AttendanceStore:
+    """出席情報の保存先"""
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, subject_info, lessons, fetched_at=None):
+        """1授業分の出席情報を保存（既存の行は置き換える）
+
+        lessons は number（授業回）と status を持つオブジェクト（main.Lesson）のリスト。
+        """
+        semester = subject_info.get('semester', '')
+        subject = subject_info['subject']
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO subjects (semester, subject, day_and_period, fetched_at) VALUES (?, ?, ?, ?)",
+                (semester, subject, subject_info.get('dayAndPeriod', ''), fetched_at or time.time()))
+            self.conn.execute("DELETE FROM attendance WHERE semester = ? AND subject = ?", (semester, subject))
+            self.conn.executemany(
+                "INSERT INTO attendance (semester, subject, lesson, status) VALUES (?, ?, ?, ?)",
+                [(semester, subject, str(lesson.number), lesson.status) for lesson in lessons])
+
+    def fetched_at(self, semester, subject):
+        row = self.conn.execute(
+            "SELECT fetched_at FROM subjects WHERE semester = ? AND subject = ?", (semester, subject)).fetchone()
+        return row[0] if row else None
+
+    def load(self, semester, subject):
+        """保存済みの出席情報（attendance_data と同じ形式）。なければ None"""
+        rows = self.conn.execute(
+            "SELECT lesson, status FROM attendance WHERE semester = ? AND subject = ? "
+            "ORDER BY CAST(lesson AS INTEGER)", (semester, subject)).fetchall()
+        if not rows:
+            return None
+        return [{'lesson': lesson, 'status': status} for lesson, status in rows]
+
+    def semesters(self):
+        """保存済みの学期名（古い順）"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT semester FROM subjects ORDER BY semester")]
+
+    def subjects(self, term=""):
+        """学期名が term で始まる授業の (semester, subject, day_and_period) のリスト"""
+        return self.conn.execute(
+            "SELECT semester, subject, day_and_period FROM subjects WHERE substr(semester, 1, length(?)) = ? "
+            "ORDER BY semester, subject", (term, term)).fetchall()
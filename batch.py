@@ -0,0 +1,199 @@
+"""複数アカウントの一括取得
+
+アカウントごとにセッションファイルと保存先を分け、ワーカープロセスを上限付きで並列に動かす。
+ポータルへのリクエストは全プロセス共通のレート制限（--rate 件/秒）を通してから送る。
+結果は1つのJSON（--out）にまとめ、アカウントごとの成否を最後に表示する。
+
+    python batch.py --accounts accounts.json --workers 4 --rate 5
+
+accounts.json の形式（session_file / store を省略すると sessions/<name>.json, stores/<name>.db）:
+
+    [
+        {"name": "student01", "session_file": "sessions/student01.json"},
+        {"name": "student02", "store": "stores/student02.db"}
+    ]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import analytics
+import main
+import render
+from portal_http import SessionExpiredError
+
+
+class RateLimiter:
+    """プロセス間で共有する、リクエストの最小間隔によるレート制限"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = multiprocessing.Lock()
+        self.next_at = multiprocessing.Value("d", 0.0, lock=False)
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            at = max(now, self.next_at.value)
+            self.next_at.value = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+# ワーカープロセスごとのレート制限（_init_worker で設定）
+_limiter = None
+
+
+def _init_worker(limiter):
+    global _limiter
+    _limiter = limiter
+
+
+def load_accounts(path):
+    """アカウント一覧を読み込み、session_file / store の既定値を補う"""
+    with open(path, "r") as f:
+        accounts = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for account in accounts:
+        name = account["name"]
+        account.setdefault("session_file", os.path.join("sessions", f"{name}.json"))
+        account.setdefault("store", os.path.join("stores", f"{name}.db"))
+        account["session_file"] = os.path.join(base, account["session_file"])
+        account["store"] = os.path.join(base, account["store"])
+    return accounts
+
+
+def run_account(account, options, log_dir):
+    """1アカウント分を取得する（ワーカープロセスで実行）。ログは log_dir/<name>.log に書く"""
+    name = account["name"]
+    os.makedirs(os.path.dirname(account["store"]) or ".", exist_ok=True)
+    log_path = os.path.join(log_dir, f"{name}.log")
+    config = main.FetchConfig(
+        **options,
+        session_file=account["session_file"],
+        store_path=account["store"],
+        interactive=False,
+        throttle=_limiter.wait if _limiter is not None else None,
+    )
+    record = {"account": name, "status": "failed", "error": None, "subjects": [],
+              "failed_subjects": [], "log": log_path}
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            subject_list, attendance_results = main.fetch_subjects_and_attendance(config)
+        except SessionExpiredError as e:
+            record["error"] = f"セッションが無効です: {str(e)}"
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {str(e)}"
+        else:
+            record["subjects"] = [render.as_record(result) for result in attendance_results if result]
+            record["failed_subjects"] = [subject_info['subject'] for subject_info, result
+                                         in zip(subject_list, attendance_results) if not result]
+            if not subject_list:
+                record["error"] = "授業一覧が取得できませんでした"
+            else:
+                record["status"] = "partial" if record["failed_subjects"] else "ok"
+    record["elapsed"] = time.perf_counter() - started
+    record["phases"] = dict(main.run_metrics["phases"])
+    record["peak_rss_mb"] = main.run_metrics.get("peak_rss_mb")
+    return record
+
+
+def print_report(records, wall):
+    print("\n" + "=" * 80)
+    print("📊 アカウント別の結果")
+    print("=" * 80)
+    for record in records:
+        mark = {"ok": "✅", "partial": "⚠️", "failed": "❌"}[record["status"]]
+        got = len(record["subjects"])
+        total = got + len(record["failed_subjects"])
+        line = f"{mark} {record['account']:<20} {got:>3}/{total:<3} {record['elapsed']:>7.2f}秒"
+        if record.get("peak_rss_mb") is not None:
+            line += f" {record['peak_rss_mb']:>7.1f}MB"
+        if record["error"]:
+            line += f"  {record['error']}"
+        elif record["failed_subjects"]:
+            line += f"  取得失敗: {', '.join(record['failed_subjects'])}"
+        print(line)
+    counts = {status: sum(1 for r in records if r["status"] == status) for status in ("ok", "partial", "failed")}
+    print("-" * 80)
+    print(f"成功{counts['ok']}件 / 一部失敗{counts['partial']}件 / 失敗{counts['failed']}件 "
+          f"（全体 {wall:.2f}秒）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OECU 出席情報の一括取得（複数アカウント）")
+    parser.add_argument("--accounts", required=True, help="アカウント一覧のJSONファイル")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="同時に処理するアカウント数（ワーカープロセス数）")
+    parser.add_argument("--rate", type=float, default=5,
+                        help="ポータルへのリクエスト数の上限（全ワーカー合計、件/秒。0で無制限）")
+    parser.add_argument("--engine", choices=["auto", "browser", "http"], default="auto",
+                        help="取得方法（main.py と同じ）")
+    parser.add_argument("--nav", choices=["reload", "back", "direct", "inpage"], default="reload",
+                        help="ブラウザでの授業間の移動方法（main.py と同じ）")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="アカウントごとに同時に開くページ数")
+    parser.add_argument("--fast", action="store_true", help="高速プロファイル（main.py と同じ）")
+    parser.add_argument("--incremental", action="store_true", help="差分取得（main.py と同じ）")
+    parser.add_argument("--low-memory", action="store_true", help="低メモリモード（main.py と同じ）")
+    parser.add_argument("--ttl-hours", type=float, default=24 * 7,
+                        help="差分取得で保存済みデータを使う最大の経過時間（時間）")
+    parser.add_argument("--out", default="batch_results.json", help="まとめた結果の保存先")
+    parser.add_argument("--log-dir", default="batch_logs", help="アカウントごとのログの保存先")
+    parser.add_argument("--history", default=None, help="全アカウントの結果を追記する出席履歴（analytics.py）")
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.accounts)
+    options = {
+        "engine": args.engine,
+        "nav": args.nav,
+        "concurrency": args.concurrency,
+        "fast": args.fast,
+        "incremental": args.incremental,
+        "ttl_hours": args.ttl_hours,
+        "low_memory": args.low_memory,
+    }
+    os.makedirs(args.log_dir, exist_ok=True)
+    workers = max(1, min(args.workers, len(accounts)))
+    print(f"🚀 {len(accounts)}件のアカウントを{workers}並列で処理します（上限 {args.rate}件/秒）")
+
+    run_started = time.perf_counter()
+    records = []
+    limiter = RateLimiter(args.rate)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(limiter,)) as executor:
+        futures = {executor.submit(run_account, account, options, args.log_dir): account for account in accounts}
+        for i, future in enumerate(as_completed(futures)):
+            account = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # ワーカープロセス自体の異常終了など
+                record = {"account": account["name"], "status": "failed", "error": f"{type(e).__name__}: {str(e)}",
+                          "subjects": [], "failed_subjects": [], "elapsed": 0.0, "phases": {}, "log": None}
+            records.append(record)
+            print(f"{'✅' if record['status'] != 'failed' else '❌'} [{i+1}/{len(accounts)}] {record['account']}")
+    wall = time.perf_counter() - run_started
+
+    order = {account["name"]: i for i, account in enumerate(accounts)}
+    records.sort(key=lambda record: order[record["account"]])
+    with open(args.out, "w") as f:
+        json.dump({"generated_at": datetime.now().isoformat(timespec="seconds"), "wall": wall,
+                   "accounts": records}, f, ensure_ascii=False, indent=2)
+    print_report(records, wall)
+    if args.history:
+        history = analytics.AttendanceHistory.load(args.history, mmap=False)
+        for record in records:
+            # 取得できずに保存済みデータで補った授業（stale）は履歴に加えない（main.py と同じ）
+            history.append([subject for subject in record["subjects"] if not subject["stale"]], record["account"])
+        history.save(args.history)
+        print(f"📈 出席履歴に追記しました: {args.history}（{len(history)}件）")
+    print(f"\n✅ 結果を保存しました: {args.out}")
+    exit(0 if all(record["status"] != "failed" for record in records) else 1)
@@ -0,0 +1,152 @@
+"""オフライン代替サーバー（mock_portal.py）を相手に main.py を実行するベンチマーク
+
+各シナリオを空の作業ディレクトリで main.py --metrics-out 付きで実行し、
+全体の実行時間・フェーズ別の時間・授業ごとの所要時間（p50/p95）を表示する。
+
+    python benchmark.py --subjects 12 --latency 0.3 --jitter 0.1 --repeat 3
+    python benchmark.py --scenarios http,browser-direct
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import mock_portal
+import render
+from readiness import percentile
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# シナリオ名 → main.py に渡す引数
+SCENARIOS = {
+    "http": ["--engine", "http"],
+    "browser": ["--engine", "browser"],
+    "browser-back": ["--engine", "browser", "--nav", "back"],
+    "browser-direct": ["--engine", "browser", "--nav", "direct"],
+    "browser-inpage": ["--engine", "browser", "--nav", "inpage"],
+    "browser-concurrent": ["--engine", "browser", "--concurrency", "4"],
+    "browser-fast": ["--engine", "browser", "--fast", "--allow-hosts", "127.0.0.1"],
+}
+
+
+def pad(text, width, right=False):
+    """全角文字を2桁として width 桁に揃える"""
+    space = " " * max(0, width - render.display_width(text))
+    return space + text if right else text + space
+
+
+def run_once(portal_url, session_state, extra_args, timeout):
+    """空の作業ディレクトリで main.py を1回実行し、計測結果を返す"""
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "session.json"), "w") as f:
+            json.dump(session_state, f)
+        metrics_path = os.path.join(workdir, "metrics.json")
+        env = dict(os.environ, OECU_PORTAL_URL=portal_url)
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, MAIN_SCRIPT, *extra_args, "--metrics-out", metrics_path],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+        wall = time.perf_counter() - started
+        if result.returncode != 0 or not os.path.exists(metrics_path):
+            lines = (result.stderr or result.stdout).strip().splitlines()
+            errors = [line for line in lines if "Error" in line] or lines
+            return {"error": errors[-1].strip() if errors else f"exit {result.returncode}"}
+        with open(metrics_path, "r") as f:
+            metrics = json.load(f)
+    metrics["process_wall"] = wall
+    return metrics
+
+
+def summarize(runs):
+    """複数回の実行結果をまとめる（時間は中央値、授業ごとの時間は全実行分から算出）"""
+    ok = [run for run in runs if "error" not in run]
+    if not ok:
+        return {"error": runs[-1]["error"] if runs else "no runs"}
+    latencies = [x for run in ok for x in run.get("subject_latencies", [])]
+    if not latencies:
+        # 授業を取得したのに所要時間がなければ、計測の記録漏れ（集計できないので失敗扱い）
+        return {"error": "授業ごとの所要時間が記録されていません"}
+    phases = {}
+    for run in ok:
+        for name, seconds in run.get("phases", {}).items():
+            phases.setdefault(name, []).append(seconds)
+    return {
+        "runs": len(ok),
+        "failed": len(runs) - len(ok),
+        "wall": statistics.median(run["process_wall"] for run in ok),
+        "phases": {name: statistics.median(values) for name, values in phases.items()},
+        "subject_p50": percentile(latencies, 0.5),
+        "subject_p95": percentile(latencies, 0.95),
+        "success": ok[-1].get("success"),
+        "subjects": ok[-1].get("subjects"),
+    }
+
+
+def print_report(results):
+    print("\n" + "=" * 100)
+    print("📊 ベンチマーク結果（時間は秒、複数回実行した場合は中央値）")
+    print("=" * 100)
+    print(pad("シナリオ", 20) + "".join(pad(h, 8, right=True) for h in
+                                      ["全体", "起動", "一覧", "授業", "表示", "p50", "p95"]) + "  取得")
+    print("-" * 100)
+    for name, summary in results.items():
+        if "error" in summary:
+            print(f"{name:<20}  ❌ {summary['error']}")
+            continue
+        phases = summary["phases"]
+
+        def cell(value):
+            return f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+
+        print(f"{name:<20}{cell(summary['wall'])}{cell(phases.get('browser_launch'))}"
+              f"{cell(phases.get('list_load'))}{cell(phases.get('subjects'))}{cell(phases.get('render'))}"
+              f"{cell(summary['subject_p50'])}{cell(summary['subject_p95'])}"
+              f"  {summary['success']}/{summary['subjects']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="オフライン代替サーバーを使ったベンチマーク")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"実行するシナリオ（カンマ区切り）: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=1, help="シナリオごとの実行回数")
+    parser.add_argument("--subjects", type=int, default=12, help="現学期の授業数")
+    parser.add_argument("--full-year", type=int, default=2, help="うち通年授業（26回）の数")
+    parser.add_argument("--latency", type=float, default=0.2, help="HTMLの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="応答遅延のばらつき（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="1回の実行の制限時間（秒）")
+    parser.add_argument("--json-out", default=None, help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    server, portal = mock_portal.start_server(
+        subjects=args.subjects, full_year=args.full_year, latency=args.latency,
+        jitter=args.jitter, seed=args.seed)
+    portal_url = f"http://127.0.0.1:{server.server_address[1]}"
+    session_state = mock_portal.session_state(server)
+    print(f"🧪 代替ポータル: {portal_url} （授業{args.subjects}件、遅延{args.latency}±{args.jitter}秒）")
+
+    results = {}
+    for name in [n.strip() for n in args.scenarios.split(",") if n.strip()]:
+        if name not in SCENARIOS:
+            print(f"⚠️ 不明なシナリオ: {name}")
+            continue
+        runs = []
+        for i in range(args.repeat):
+            print(f"🔄 {name} [{i+1}/{args.repeat}] を実行中...")
+            try:
+                runs.append(run_once(portal_url, session_state, SCENARIOS[name], args.timeout))
+            except subprocess.TimeoutExpired:
+                runs.append({"error": "タイムアウト"})
+        results[name] = summarize(runs)
+
+    server.shutdown()
+    print_report(results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果を保存しました: {args.json_out}")
+    exit(1 if any("error" in summary for summary in results.values()) else 0)
@@ -0,0 +1,366 @@
+"""常駐モード：ブラウザを起動したままにして、出席情報をローカルのJSONエンドポイントで返す
+
+    python daemon.py --port 8765 --cache-minutes 10
+    curl http://127.0.0.1:8765/attendance
+    curl "http://127.0.0.1:8765/attendance?subject=線形代数学&refresh=1"
+    python daemon.py --unix /tmp/oecu.sock --engine http
+
+ブラウザの操作は専用のスレッド1つで行い（Playwright の同期APIはスレッドをまたいで使えない）、
+リクエストを処理するスレッドはその結果を待つだけにする。授業ごとに取得時刻を持ち、
+cache-minutes 以内の結果はそのまま返す。取得中に届いたリクエストは同じ取得の完了を待つ。
+リクエストがない間も keepalive-minutes ごとに授業一覧を開き直してセッションを維持する。
+"""
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import main
+import render
+from portal_http import PortalClient, SessionExpiredError
+from resource_filter import ResourceBlocker
+from scheduler import FetchScheduler
+
+
+def fetch_scheduled(config, subjects, fetch_subjects):
+    """FetchScheduler（--budget / --retries / --breaker）に従って取得し、subjects と同じ順序の結果を返す"""
+    scheduler = FetchScheduler.from_config(config, main.latency_tracker)
+    results = {subject_info['buttonId']: result for subject_info, result in scheduler.run(subjects, fetch_subjects)}
+    return [results.get(subject_info['buttonId']) for subject_info in subjects]
+
+
+class BrowserBackend:
+    """ブラウザを起動したままにして取得する（ワーカースレッドからのみ呼ぶ）"""
+
+    def __init__(self, config):
+        self.config = config
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.asset_cache = None
+
+    def open(self):
+        main.import_playwright()
+        started = time.perf_counter()
+        self.playwright = main.sync_playwright().start()
+        storage_state = main.load_session(self.config.session_file)
+        if storage_state is None:
+            raise SessionExpiredError(f"{self.config.session_file} がありません。先に main.py でログインしてください")
+        self.browser = self.playwright.chromium.launch(
+            headless=True, args=main.LOW_MEMORY_ARGS if self.config.low_memory else None)
+        self.context = self.browser.new_context(storage_state=storage_state)
+        self.asset_cache = main.open_asset_cache(self.context, self.config)
+        if self.config.low_memory:
+            main.apply_low_memory(self.context)
+        if self.config.fast:
+            ResourceBlocker(self.config.blocked_types, self.config.allowed_hosts).attach(self.context)
+        self.page = self.context.new_page()
+        print(f"🚀 ブラウザを起動しました ({time.perf_counter() - started:.2f}秒)")
+
+    def list_subjects(self):
+        main.open_subject_list_page(self.page)
+        if not self.page.url.startswith(main.LIST_URL):
+            raise SessionExpiredError(f"授業一覧ではなく {self.page.url} に移動しました（セッション切れ）")
+        return main.get_subject_list(self.page)
+
+    def fetch(self, subjects):
+        """list_subjects の直後に呼ぶこと（授業一覧ページが開いている前提）"""
+        recycler = (main.PageRecycler(self.context, self.page, self.config.recycle_every)
+                    if self.config.low_memory else None)
+        results = fetch_scheduled(self.config, subjects, lambda pending: main.fetch_subjects_with_browser(
+            self.page, self.context, pending, self.config, recycler))
+        if recycler is not None:
+            self.page = recycler.page  # 開き直したページを次回以降も使う
+        main.latency_tracker.save()
+        return results
+
+    def keepalive(self):
+        self.list_subjects()
+        main.save_session(self.context, self.config.session_file)
+
+    def close(self):
+        """起動済みの分だけを閉じる（open() が途中で失敗した後に呼んでもよい。何度呼んでもよい）"""
+        try:
+            if self.asset_cache is not None:
+                self.asset_cache.save()
+            if self.browser is not None:
+                self.browser.close()
+        finally:
+            if self.playwright is not None:
+                self.playwright.stop()
+            self.playwright = self.browser = self.context = self.page = self.asset_cache = None
+
+
+class HttpBackend:
+    """保存済みセッションのHTTP接続を維持して取得する（ブラウザ不要）"""
+
+    def __init__(self, config):
+        self.config = config
+        self.client = None
+
+    def open(self):
+        if not os.path.exists(self.config.session_file):
+            raise SessionExpiredError(f"{self.config.session_file} がありません。先に main.py でログインしてください")
+        self.client = PortalClient.from_session_file(self.config.session_file,
+                                                     timeout=self.config.subject_timeout or 10)
+
+    def list_subjects(self):
+        return main.list_subjects_with_http(self.client)
+
+    def fetch(self, subjects):
+        return fetch_scheduled(self.config, subjects,
+                               lambda pending: main.fetch_subjects_with_http(self.client, pending))
+
+    def keepalive(self):
+        self.list_subjects()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+class AttendanceDaemon:
+    """授業ごとのキャッシュと、取得をまとめて実行するワーカースレッド"""
+
+    def __init__(self, backend, cache_seconds=600, keepalive_seconds=900):
+        self.backend = backend
+        self.cache_seconds = cache_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.subject_list = []
+        self.entries = {}      # (学期, 授業名) → (取得時刻, SubjectAttendance)
+        self.inflight = {}     # refresh の有無 → 実行待ち・実行中の取得の Future
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "scrapes": 0, "scraped_subjects": 0}
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.ready = Future()
+        self.thread = threading.Thread(target=self._run, name="attendance-worker", daemon=True)
+
+    def start(self):
+        """ワーカースレッドを起動し、ブラウザ（または接続）の準備ができるまで待つ"""
+        self.thread.start()
+        self.ready.result()
+
+    def stop(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def get(self, subject=None, refresh=False, timeout=None):
+        """出席情報を返す（キャッシュが古ければ取得を待つ）
+
+        subject を指定した場合はその授業だけを返す。refresh=True ならキャッシュを使わない。
+        """
+        with self.lock:
+            self.stats["requests"] += 1
+            if not refresh and self._is_fresh(subject):
+                self.stats["cache_hits"] += 1
+                return self._snapshot(subject)
+            future = self.inflight.get(refresh)
+            if future is None:
+                future = Future()
+                self.inflight[refresh] = future
+                self.jobs.put((future, refresh))
+            else:
+                self.stats["coalesced"] += 1
+        future.result(timeout)
+        with self.lock:
+            return self._snapshot(subject)
+
+    def status(self):
+        with self.lock:
+            return {**self.stats, "subjects": len(self.subject_list), "cached": len(self.entries)}
+
+    def _key(self, subject_info):
+        return subject_info['semester'], subject_info['subject']
+
+    def _is_stale(self, subject_info, now):
+        entry = self.entries.get(self._key(subject_info))
+        return entry is None or now - entry[0] >= self.cache_seconds
+
+    def _selected(self, subject):
+        return [s for s in self.subject_list if subject is None or s['subject'] == subject]
+
+    def _is_fresh(self, subject):
+        selected = self._selected(subject)
+        now = time.time()
+        return bool(selected) and not any(self._is_stale(s, now) for s in selected)
+
+    def _snapshot(self, subject):
+        results = []
+        for subject_info in self._selected(subject):
+            entry = self.entries.get(self._key(subject_info))
+            if entry is None:
+                continue
+            fetched_at, attendance = entry
+            results.append({**render.as_record(attendance), "fetched_at": fetched_at})
+        return results
+
+    def _run(self):
+        try:
+            self.backend.open()
+        except BaseException as e:
+            self.ready.set_exception(e)
+            self.backend.close()
+            return
+        self.ready.set_result(True)
+        try:
+            while True:
+                try:
+                    job = self.jobs.get(timeout=self.keepalive_seconds)
+                except queue.Empty:
+                    self._keepalive()
+                    continue
+                if job is None:
+                    break
+                future, refresh = job
+                try:
+                    self._refresh(refresh)
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                with self.lock:
+                    # 取得中に届いたリクエストはこの取得の結果を待っている
+                    del self.inflight[refresh]
+                if error is None:
+                    future.set_result(True)
+                else:
+                    future.set_exception(error)
+        finally:
+            self.backend.close()
+
+    def _refresh(self, refresh):
+        """授業一覧を開き直し、キャッシュが古い授業（refresh=True なら全授業）を取得する"""
+        main.reset_metrics()
+        started = time.perf_counter()
+        subject_list = self.backend.list_subjects()
+        now = time.time()
+        with self.lock:
+            stale = [s for s in subject_list if refresh or self._is_stale(s, now)]
+        results = self.backend.fetch(stale) if stale else []
+        fetched_at = time.time()
+        with self.lock:
+            self.subject_list = subject_list
+            for subject_info, result in zip(stale, results):
+                # 取得に失敗した授業は前回の結果を残す
+                if result is not None:
+                    self.entries[self._key(subject_info)] = (fetched_at, result)
+            self.stats["scrapes"] += 1
+            self.stats["scraped_subjects"] += len(stale)
+        failed = sum(1 for result in results if result is None)
+        print(f"✅ {len(stale)}/{len(subject_list)}件を取得しました（失敗{failed}件、"
+              f"{time.perf_counter() - started:.2f}秒）")
+
+    def _keepalive(self):
+        try:
+            self.backend.keepalive()
+            print("🔄 セッションを維持しました")
+        except Exception as e:
+            print(f"⚠️ セッションの維持に失敗しました: {str(e)}")
+
+
+def make_handler(daemon, request_timeout=None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/health":
+                self._send(200, {"status": "ok", **daemon.status()})
+                return
+            if url.path != "/attendance":
+                self._send(404, {"error": "not found"})
+                return
+            subject = query.get("subject", [None])[0]
+            refresh = query.get("refresh", ["0"])[0] in ("1", "true")
+            try:
+                results = daemon.get(subject, refresh, request_timeout)
+            except SessionExpiredError as e:
+                self._send(503, {"error": f"セッションが無効です: {str(e)}"})
+                return
+            except FutureTimeoutError:
+                self._send(504, {"error": "取得が時間内に終わりませんでした"})
+                return
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+            if subject is not None and not results:
+                self._send(404, {"error": f"授業が見つかりません: {subject}"})
+                return
+            self._send(200, results)
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def build_server(daemon, host="127.0.0.1", port=8765, unix_path=None, request_timeout=None):
+    handler = make_handler(daemon, request_timeout)
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        return ThreadingUnixHTTPServer(unix_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OECU 出席情報の常駐モード（ローカルのJSONエンドポイント）")
+    main.add_fetch_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    parser.add_argument("--unix", default=None, help="TCPの代わりに待ち受けるUnixソケットのパス")
+    parser.add_argument("--cache-minutes", type=float, default=10,
+                        help="授業ごとの取得結果をそのまま返す時間（分）")
+    parser.add_argument("--keepalive-minutes", type=float, default=15,
+                        help="リクエストがない間にセッションを維持する間隔（分）")
+    parser.add_argument("--request-timeout", type=float, default=300,
+                        help="1リクエストで取得を待つ最大時間（秒）")
+    args = parser.parse_args()
+
+    config = main.FetchConfig(**main.fetch_options(args), interactive=False)
+    backend = HttpBackend(config) if config.engine == "http" else BrowserBackend(config)
+    daemon = AttendanceDaemon(backend, args.cache_minutes * 60, args.keepalive_minutes * 60)
+    try:
+        daemon.start()
+    except Exception as e:
+        print(f"❌ 常駐モードを開始できませんでした: {str(e)}")
+        exit(1)
+
+    server = build_server(daemon, args.host, args.port, args.unix, args.request_timeout)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"🟢 常駐モードで待ち受けています: {where} （/attendance, /health）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+    print("\n✅ 常駐モードを終了しました")
@@ -1,21 +1,133 @@
-from playwright.sync_api import sync_playwright, TimeoutError
+import http.client
 import json
 import os
-from datetime import datetime
-import unicodedata
+from datetime import datetime, timedelta
+import sys
+import argparse
+import contextlib
+import time
+from urllib.parse import urlencode
+from dataclasses import dataclass
+from portal_http import PortalClient, PortalError, SessionExpiredError, parse_attendance, parse_subject_rows
+from session_probe import load_storage_state, save_storage_state, probe_session, VALID, EXPIRED
+from attendance_store import AttendanceStore, STORE_FILE, is_due
+from archive import HtmlArchive, ARCHIVE_DIR
+from readiness import LatencyTracker, wait_until_ready
+from profiler import Profiler, NullProfiler
+from scheduler import FetchScheduler
+from rss_monitor import RssMonitor
+from asset_cache import AssetCache, ASSET_CACHE_DIR
+import render
+import analytics
+from resource_filter import (ResourceBlocker, ResourceSizeRecorder,
+                             DEFAULT_BLOCKED_TYPES, DEFAULT_ALLOWED_HOSTS)
 
 # セッション保存用のファイル
 SESSION_FILE = "session.json"
 
+# ポータルのURL（環境変数 OECU_PORTAL_URL でオフライン代替サーバー等に切り替えられる）
+PORTAL_URL = os.environ.get("OECU_PORTAL_URL", "https://myportal.osakac.ac.jp").rstrip("/")
+
+# 授業一覧ページのURL
+LIST_URL = PORTAL_URL + "/m/mycontent/list.xhtml"
+
+# 計測結果（--metrics-out で JSON に書き出す）
+run_metrics = {"phases": {}, "subject_latencies": []}
+
+# 読み込み時間の実測値（タイムアウトの自動調整に使う）
+latency_tracker = LatencyTracker()
+
+# フェーズごとの所要時間の記録（--profile で Profiler に差し替える）
+profiler = NullProfiler()
+
+# 取得したHTMLの保存先（--archive の場合のみ HtmlArchive）
+archive = None
+
+# 低メモリモードで Chromium に渡す起動オプション（GPU・拡張・バックグラウンド通信・キャッシュを抑える）
+LOW_MEMORY_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--renderer-process-limit=1",
+    "--disk-cache-size=1",
+    "--media-cache-size=1",
+    "--js-flags=--max-old-space-size=128",
+    "--disable-features=site-per-process,Translate,BackForwardCache,MediaRouter",
+]
+
+# 低メモリモードで読み込まないリソース種別
+LOW_MEMORY_BLOCKED_TYPES = {"media"}
+
+# Playwright はブラウザで取得する場合のみ読み込む（import_playwright を参照）
+sync_playwright = None
+PlaywrightTimeoutError = TimeoutError
+
+@dataclass(slots=True)
+class Lesson:
+    """1回分の出席状況"""
+    number: int
+    status: str
+
+@dataclass(slots=True)
+class SubjectAttendance:
+    """1授業分の出席情報と集計結果"""
+    subject: str
+    day_and_period: str
+    semester: str
+    lessons: list
+    attendance_count: int
+    absence_count: int
+    implemented_count: int  # 未実施の代わりに実施数
+    total_count: int        # 表示対象の総回数
+    stale: bool = False     # 取得できず、保存済みの古いデータを使った場合 True
+
+@dataclass(slots=True)
+class FetchConfig:
+    """取得方法の設定（コマンドライン引数と同じ項目）"""
+    engine: str = "auto"
+    concurrency: int = 1
+    nav: str = "reload"
+    fast: bool = False
+    blocked_types: list = None
+    allowed_hosts: list = None
+    incremental: bool = False
+    ttl_hours: float = 24 * 7
+    store_path: str = STORE_FILE
+    session_file: str = SESSION_FILE
+    interactive: bool = True  # False の場合、ログインが必要なら SessionExpiredError を送出
+    throttle: object = None   # ポータルへのリクエスト前に呼ぶ関数（batch.py のレート制限）
+    on_result: object = None  # 1授業分の結果が得られるたびに呼ぶ関数 on_result(subject_info, result)
+    budget: float = None            # 授業の取得全体の時間予算（秒）。None なら無制限
+    subject_timeout: float = None   # 授業1件の読み込み待ちの上限（秒）
+    retries: int = 1                # 失敗した授業を最後に再試行する回数
+    backoff: float = 1.0            # 再試行までの待ち時間（秒、回ごとに2倍）
+    breaker_threshold: int = 3      # この件数連続で失敗したら取得を中止する
+    all_terms: bool = False         # True の場合、一覧にある全学期の授業を取得する（--backfill）
+    term: str = None                # 指定した学期を保存済みデータだけから返す（ポータルに接続しない）
+    archive: bool = False           # 取得したHTMLを archive_dir に保存する
+    archive_dir: str = ARCHIVE_DIR
+    replay: str = None              # 保存済みの実行ID（"latest" なら最新）のHTMLから解析し直す（ポータルに接続しない）
+    low_memory: bool = False        # ヘッドレス・省メモリの起動オプション・キャッシュ無効・ページの開き直し
+    recycle_every: int = 20         # 低メモリモードでページを開き直す間隔（授業数）
+    asset_cache: str = None         # 静的ファイルのディスクキャッシュの保存先（None なら使わない）
+    asset_cache_mb: float = 50      # ディスクキャッシュの上限（MB）
+
+def import_playwright():
+    """Playwright を読み込む（未インストールでもHTTP取得は使えるようにするため遅延させる）"""
+    global sync_playwright, PlaywrightTimeoutError
+    if sync_playwright is None:
+        from playwright.sync_api import sync_playwright as _sync_playwright, TimeoutError as _TimeoutError
+        sync_playwright = _sync_playwright
+        PlaywrightTimeoutError = _TimeoutError
+
 def get_display_width(text):
     """テキストの表示幅を計算（全角=2、半角=1）"""
-    width = 0
-    for char in text:
-        if unicodedata.east_asian_width(char) in ('F', 'W'):
-            width += 2  # 全角文字
-        else:
-            width += 1  # 半角文字
-    return width
+    return render.display_width(text)
 
 def to_fullwidth_number(text):
     """半角数字を全角数字に変換"""
@@ -34,25 +146,28 @@ def get_current_semester():
     else:
         return [f"{year}年度後期", f"{year}年度後期前半", f"{year}年度後期後半"]
 
+def is_second_semester(semester):
+    """学期名（「2025年度後期前半」など）が後期か"""
+    return "後期" in semester
 
-def get_subject_list(page):
-    """授業一覧から対象の授業を取得"""
-    current_semester = get_current_semester()
-    print(f"🎓 対象学期: {current_semester}")
-    
+def is_current_term(semester):
+    return semester in get_current_semester()
+
+
+def get_subject_list(page, all_terms=False):
+    """授業一覧の全行を1回で読み取り、対象の授業を取得（all_terms なら全学期）"""
     try:
-        subject_data = page.evaluate(f"""
-    () => {{
+        subject_data = page.evaluate("""
+    () => {
         const results = [];
         const rows = document.querySelectorAll("table.main_table tbody tr");
-        const targetSemesters = {json.dumps(current_semester)};  // PythonリストをJS配列に変換
 
-        rows.forEach((row, index) => {{
+        rows.forEach((row, index) => {
             const semesterCell = row.querySelector("td.hide_xs");
             const subjectCell = row.querySelector("td.mb_disp");
             const button = row.querySelector("button[id*='form-list-']");
 
-            if (semesterCell && subjectCell && button) {{
+            if (semesterCell && subjectCell && button) {
                 const semester = semesterCell.textContent.trim();
                 const subject = subjectCell.textContent.trim();
                 const buttonId = button.id;
@@ -61,66 +176,75 @@ def get_subject_list(page):
                 const cells = row.querySelectorAll("td");
                 let day = "";
                 let period = "";
-                for (let i = 0; i < cells.length; i++) {{
+                for (let i = 0; i < cells.length; i++) {
                     const text = cells[i].textContent.trim();
                     if (text.match(/^[月火水木金土日]曜日$/)) day = text.replace("曜日", "");
                     if (text.match(/^[0-9]+時限$/)) period = text.replace("時限", "");
-                }}
+                }
                 const dayAndPeriod = day && period ? day + period : "";
 
-                // 学期が一致するもののみ追加（includesで比較）
-                if (targetSemesters.includes(semester)) {{
-                    results.push({{
-                        semester,
-                        subject,
-                        buttonId,
-                        dayAndPeriod,
-                        index
-                    }});
-                }}
-            }}
-        }});
+                // 学期の絞り込みは Python 側で行う（select_terms）
+                results.push({
+                    semester,
+                    subject,
+                    buttonId,
+                    dayAndPeriod,
+                    index
+                });
+            }
+        });
         return results;
-    }}
+    }
 """)
-
-        
-        # 曜日と時限でソート（Python側で処理）
-        def sort_by_day_and_period(item):
-            day_order = {'月': 1, '火': 2, '水': 3, '木': 4, '金': 5, '土': 6, '日': 7}
-            day_and_period = item.get('dayAndPeriod', '')
-            
-            if not day_and_period:
-                return (999, 999)  # 曜日・時限がない場合は最後に表示
-            
-            day = day_and_period[0]
-            try:
-                period = int(day_and_period[1:])
-            except ValueError:
-                return (999, 999)
-            
-            return (day_order.get(day, 999), period)
-        
-        subject_data.sort(key=sort_by_day_and_period)
-        
-        print(f"📚 {current_semester}の授業を{len(subject_data)}件見つけました:")
-        for i, subject in enumerate(subject_data):
-            day_period = subject.get('dayAndPeriod', '')
-            if day_period:
-                print(f"  {i+1}. {day_period} {subject['subject']}")
-            else:
-                print(f"  {i+1}. {subject['subject']}")
-        
-        return subject_data
+        return select_terms(subject_data, all_terms)
     except Exception as e:
         print(f"❌ 授業一覧の取得中にエラーが発生しました: {str(e)}")
         return []
 
-def get_attendance_for_subject_by_click(page, context, subject_info, subject_index):
-    """クリックして授業ページを開き、出席情報を取得"""
+def select_terms(rows, all_terms=False):
+    """授業一覧の行から今学期（all_terms なら全学期）の授業を選び、曜日・時限順に返す"""
+    if all_terms:
+        terms = sorted({row['semester'] for row in rows})
+        print(f"🎓 対象学期: 全学期 {terms}")
+        return sort_and_report_subjects(list(rows), "全学期")
+    current_semester = get_current_semester()
+    print(f"🎓 対象学期: {current_semester}")
+    return sort_and_report_subjects(
+        [row for row in rows if row['semester'] in current_semester], current_semester)
+
+def sort_and_report_subjects(subject_data, current_semester):
+    """授業一覧を曜日・時限で並び替えて表示"""
+    # 曜日と時限でソート（Python側で処理）
+    def sort_by_day_and_period(item):
+        day_order = {'月': 1, '火': 2, '水': 3, '木': 4, '金': 5, '土': 6, '日': 7}
+        day_and_period = item.get('dayAndPeriod', '')
+        
+        if not day_and_period:
+            return (999, 999)  # 曜日・時限がない場合は最後に表示
+        
+        day = day_and_period[0]
+        try:
+            period = int(day_and_period[1:])
+        except ValueError:
+            return (999, 999)
+        
+        return (day_order.get(day, 999), period)
     
-    try:
-        # 授業のボタンをクリック
+    subject_data.sort(key=sort_by_day_and_period)
+    
+    print(f"📚 {current_semester}の授業を{len(subject_data)}件見つけました:")
+    for i, subject in enumerate(subject_data):
+        day_period = subject.get('dayAndPeriod', '')
+        if day_period:
+            print(f"  {i+1}. {day_period} {subject['subject']}")
+        else:
+            print(f"  {i+1}. {subject['subject']}")
+    
+    return subject_data
+
+def click_subject_button(page, subject_info):
+    """授業のボタンをクリックして授業ページへの遷移を開始する（完了は待たない）"""
+    with profiler.span("click", subject=subject_info['subject']):
         click_result = page.evaluate(f"""
             () => {{
                 const button = document.getElementById('{subject_info['buttonId']}');
@@ -134,39 +258,24 @@ def get_attendance_for_subject_by_click(page, context, subject_info, subject_ind
             }}
         """)
         
-        if not click_result:
-            print(f"❌ ボタンが見つかりませんでした")
-            return None
-        
-        # ページ遷移を待つ
-        try:
-            page.wait_for_load_state("networkidle", timeout=8000)  # 15秒→8秒に短縮
-        except TimeoutError:
-            print(f"⚠️ ページ遷移でタイムアウト")
-        
-        # 出席情報要素が読み込まれるまで待機
-        try:
-            page.wait_for_selector("div.contents_state", timeout=5000)  # 10秒→5秒に短縮
-        except TimeoutError:
-            print(f"⚠️ 出席情報要素の読み込みでタイムアウト")
-        
-        # 最小限の待機（500ms→200msに短縮）
-        page.wait_for_timeout(200)
-        
-        # 出席情報を取得
-        attendance_data = page.evaluate("""
-            () => {
+    if not click_result:
+        print(f"❌ ボタンが見つかりませんでした")
+    return click_result
+
+# 授業ページ（root は document または DOMParser で読み込んだ文書）から出席情報を取り出す
+EXTRACT_ATTENDANCE_JS = """
+            (root) => {
                 const results = [];
-                const elements = document.querySelectorAll("div.contents_state");
-                
+                const elements = root.querySelectorAll("div.contents_state");
+            
                 elements.forEach((el, index) => {
                     const lessonNumberEl = el.querySelector("div.contents_name");
                     if (!lessonNumberEl) return;
-                    
+                
                     const lessonNumber = lessonNumberEl.textContent.trim();
                     const img = el.querySelector("img");
                     let status = "―";
-                    
+                
                     if (img && img.getAttribute("title")) {
                         status = img.getAttribute("title");
                     } else {
@@ -179,389 +288,1226 @@ def get_attendance_for_subject_by_click(page, context, subject_info, subject_ind
                             }
                         }
                     }
-                    
+                
                     results.push({ lesson: lessonNumber, status: status });
                 });
-                
+            
                 return results;
             }
-        """)
+"""
+
+def read_attendance(page, subject_info):
+    """遷移先の授業ページの読み込みを待ち、出席情報を取得"""
+    try:
+        # 出席情報要素が揃うまで待機（タイムアウトは過去の実測値から決める）
+        try:
+            with profiler.span("wait_subject"):
+                wait_until_ready(page, "subject", latency_tracker, time.perf_counter())
+        except PlaywrightTimeoutError:
+            profiler.mark("timeout", where="read_attendance")
+            print(f"⚠️ 出席情報要素の読み込みでタイムアウト")
         
-        print(f"✅ {len(attendance_data)}件取得")
+        # 出席情報を取得
+        with profiler.span("extract_attendance"):
+            attendance_data = page.evaluate(f"() => ({EXTRACT_ATTENDANCE_JS})(document)")
+            if archive is not None:
+                archive.record_subject(subject_info['buttonId'], page.content())
+        return summarize_attendance(subject_info, attendance_data)
         
-        if len(attendance_data) == 0:
-            print(f"⚠️ 出席情報が見つかりませんでした")
+    except Exception as e:
+        print(f"❌ エラー: {str(e)}")
+        return None
+
+def summarize_attendance(subject_info, attendance_data):
+    """取得した出席情報を集計して SubjectAttendance を作る（0件の場合は None）"""
+    print(f"✅ {len(attendance_data)}件取得")
+    
+    if len(attendance_data) == 0:
+        print(f"⚠️ 出席情報が見つかりませんでした")
+        return None
+    
+    # 出席状況の集計（未実施はカウントしない）
+    # 前期/後期は授業の学期で判断する（過去の学期の授業も正しく集計するため）
+    semester = subject_info.get('semester') or get_current_semester()[0]
+    
+    # 通年授業の場合、前期/後期で集計対象を分ける
+    target_attendance_data = attendance_data
+    if len(attendance_data) > 13:  # 通年授業の場合
+        if is_second_semester(semester):
+            # 後期の場合、14-26回のみを集計対象とする
+            target_attendance_data = [data for data in attendance_data if int(data['lesson']) >= 14]
+        else:
+            # 前期の場合、1-13回のみを集計対象とする
+            target_attendance_data = [data for data in attendance_data if int(data['lesson']) <= 13]
+    
+    attendance_count = sum(1 for data in target_attendance_data if data['status'] == '出席')
+    absence_count = sum(1 for data in target_attendance_data if data['status'] == '欠席')
+    implemented_count = attendance_count + absence_count  # 実施された授業数
+    
+    print(f"📈 出席{attendance_count}, 欠席{absence_count}, 実施{implemented_count}")
+    
+    return SubjectAttendance(
+        subject=subject_info['subject'],
+        day_and_period=subject_info.get('dayAndPeriod', ''),
+        semester=subject_info.get('semester', ''),
+        lessons=[Lesson(int(data['lesson']), data['status']) for data in attendance_data],
+        attendance_count=attendance_count,
+        absence_count=absence_count,
+        implemented_count=implemented_count,
+        total_count=len(target_attendance_data),
+    )
+
+def get_attendance_for_subject_by_click(page, context, subject_info, subject_index):
+    """クリックして授業ページを開き、出席情報を取得"""
+    try:
+        if not click_subject_button(page, subject_info):
             return None
-        
-        # 出席状況の集計（未実施はカウントしない）
-        current_semester = get_current_semester()
-        is_second_semester = "後期" in current_semester
-        
-        # 通年授業の場合、前期/後期で集計対象を分ける
-        target_attendance_data = attendance_data
-        if len(attendance_data) > 13:  # 通年授業の場合
-            if is_second_semester:
-                # 後期の場合、14-26回のみを集計対象とする
-                target_attendance_data = [data for data in attendance_data if int(data['lesson']) >= 14]
-            else:
-                # 前期の場合、1-13回のみを集計対象とする
-                target_attendance_data = [data for data in attendance_data if int(data['lesson']) <= 13]
-        
-        attendance_count = sum(1 for data in target_attendance_data if data['status'] == '出席')
-        absence_count = sum(1 for data in target_attendance_data if data['status'] == '欠席')
-        implemented_count = attendance_count + absence_count  # 実施された授業数
-        
-        print(f"📈 出席{attendance_count}, 欠席{absence_count}, 実施{implemented_count}")
-        
-        return {
-            'subject': subject_info['subject'],
-            'dayAndPeriod': subject_info.get('dayAndPeriod', ''),
-            'attendance_data': attendance_data,
-            'attendance_count': attendance_count,
-            'absence_count': absence_count,
-            'implemented_count': implemented_count,  # 未実施の代わりに実施数
-            'total_count': len(target_attendance_data)  # 表示対象の総回数
-        }
-        
     except Exception as e:
         print(f"❌ エラー: {str(e)}")
         return None
+    return read_attendance(page, subject_info)
+
+def open_subject_list_page(page):
+    """授業一覧ページを開き、テーブルが表示されるまで待つ"""
+    try:
+        started = time.perf_counter()
+        with profiler.span("open_list"):
+            page.goto(LIST_URL, wait_until="commit")
+            wait_until_ready(page, "list", latency_tracker, started)
+        return True
+    except PlaywrightTimeoutError:
+        profiler.mark("timeout", where="open_subject_list_page")
+        print("⚠️ 授業一覧ページの読み込みでタイムアウトしました")
+    except Exception as e:
+        print(f"⚠️ 授業一覧ページの読み込み中にエラーが発生しました: {str(e)}")
+    return False
+
+def return_to_subject_list(page, subject_info, wait=True):
+    """授業一覧ページに戻る
+
+    wait=False の場合は遷移の開始だけを行い、
+    読み込みの完了は wait_for_subject_list で待つ。
+    """
+    print(f"🔄 授業一覧に戻り中...")
+    try:
+        with profiler.span("goto_list"):
+            page.goto(LIST_URL, wait_until="commit")
+    except PlaywrightTimeoutError:
+        profiler.mark("timeout", where="return_to_subject_list")
+        print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にタイムアウトしました。続行します...")
+        return
+    except Exception as e:
+        print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にエラーが発生しました: {str(e)}。続行します...")
+        return
+    if wait:
+        wait_for_subject_list(page, subject_info)
+
+def wait_for_subject_list(page, subject_info):
+    """授業一覧ページの読み込み完了を待つ"""
+    try:
+        # 授業一覧テーブルが読み込まれるまで待機
+        with profiler.span("wait_list"):
+            wait_until_ready(page, "list", latency_tracker, time.perf_counter())
+    except PlaywrightTimeoutError:
+        profiler.mark("timeout", where="wait_for_subject_list")
+        print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にタイムアウトしました。続行します...")
+    except Exception as e:
+        print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にエラーが発生しました: {str(e)}。続行します...")
+
+def return_by_history_back(page, subject_info, next_subject_info):
+    """ブラウザの「戻る」で授業一覧に戻る（bfcacheが効けば再読み込みなし）
+
+    次の授業のボタンが見つからない（一覧が古い）場合は従来どおり再読み込みする。
+    """
+    try:
+        with profiler.span("go_back"):
+            if page.go_back(wait_until="domcontentloaded", timeout=5000) is not None or page.url.startswith(LIST_URL):
+                page.wait_for_selector(f"button[id='{next_subject_info['buttonId']}']",
+                                       timeout=latency_tracker.deadline_ms("list"))
+                return
+    except PlaywrightTimeoutError:
+        profiler.mark("timeout", where="return_by_history_back")
+    except Exception as e:
+        print(f"⚠️ 履歴から戻る際にエラーが発生しました: {str(e)}")
+    print("⚠️ 履歴から授業一覧に戻れませんでした。再読み込みします...")
+    return_to_subject_list(page, subject_info)
+
+def fetch_attendance_sequentially(page, context, subject_list, nav="reload", latencies=None):
+    """1つのページで授業を順番に処理する（クリック→取得→戻る）
+
+    nav="reload" は毎回 list.xhtml を読み込み直し、nav="back" は履歴で戻る。
+    latencies にリストを渡すと授業ごとの所要時間（秒）を追加する。
+    結果は取得するたびに（一覧に戻る前に）subject_list の順に yield する。
+    """
+    for i, subject_info in enumerate(subject_list):
+        print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']} を処理中...")
+        started = time.perf_counter()
+
+        # 授業をクリックして出席情報を取得
+        with profiler.span("subject", "subject", subject=subject_info['subject']):
+            result = get_attendance_for_subject_by_click(page, context, subject_info, i)
+        yield result
+
+        # 授業一覧ページに戻る（最後の授業でない場合）
+        if i < len(subject_list) - 1:
+            if nav == "back":
+                return_by_history_back(page, subject_info, subject_list[i + 1])
+            else:
+                return_to_subject_list(page, subject_info)
+        if latencies is not None:
+            latencies.append(time.perf_counter() - started)
+
+# 授業一覧ページの各ボタンについて、送信されるフォームの内容（buttonId → action, fields）
+COLLECT_FORMS_JS = """
+        () => {
+            const forms = {};
+            document.querySelectorAll("button[id*='form-list-']").forEach(button => {
+                const form = button.form || document.getElementById(button.id.split(":")[0]);
+                if (!form) return;
+                const fields = [];
+                new FormData(form).forEach((value, name) => fields.push([name, String(value)]));
+                const name = button.name || button.id;
+                fields.push([name, button.value || name]);
+                forms[button.id] = { action: form.action || location.href, fields: fields };
+            });
+            return forms;
+        }
+"""
+
+# 一覧ページの中から各授業のフォームを fetch() で並行して送信し、DOMParser で出席情報を取り出す
+# （引数は buttonIds, concurrency, timeoutMs, keepHtml。結果は buttonId → {data, error, elapsed, html}）
+FETCH_SUBJECTS_IN_PAGE_JS = """
+        async ({ buttonIds, concurrency, timeoutMs, keepHtml }) => {
+            const forms = (""" + COLLECT_FORMS_JS + """)();
+            const extract = """ + EXTRACT_ATTENDANCE_JS + """;
+            const parser = new DOMParser();
+            const queue = buttonIds.slice();
+            const results = {};
+
+            const worker = async () => {
+                while (queue.length > 0) {
+                    const buttonId = queue.shift();
+                    const form = forms[buttonId];
+                    const started = performance.now();
+                    const result = { data: [], error: null, elapsed: 0 };
+                    const controller = new AbortController();
+                    const timer = timeoutMs ? setTimeout(() => controller.abort(), timeoutMs) : null;
+                    try {
+                        if (!form) throw new Error("ボタンが見つかりませんでした");
+                        const response = await fetch(form.action, {
+                            method: "POST",
+                            body: new URLSearchParams(form.fields),
+                            credentials: "same-origin",
+                            signal: controller.signal,
+                        });
+                        if (!response.ok) throw new Error("HTTP " + response.status);
+                        const text = await response.text();
+                        result.data = extract(parser.parseFromString(text, "text/html"));
+                        if (keepHtml) result.html = text;
+                    } catch (e) {
+                        result.error = String(e);
+                    } finally {
+                        if (timer) clearTimeout(timer);
+                        result.elapsed = (performance.now() - started) / 1000;
+                    }
+                    results[buttonId] = result;
+                }
+            };
+            await Promise.all(Array.from({ length: Math.min(concurrency, queue.length) }, worker));
+            return results;
+        }
+"""
+
+# --nav inpage で同時に送信する授業数（--concurrency で変更できる）
+INPAGE_CONCURRENCY = 6
+
+def collect_subject_forms(page):
+    """授業一覧ページの各ボタンについて、送信されるフォームの内容を取得"""
+    return page.evaluate(COLLECT_FORMS_JS)
+
+def post_subject_form(context, form, button_id=None, throttle=None):
+    """ボタンのフォームをページ遷移なしで送信し、出席情報を返す
+
+    context.request のリクエストは context.route を通らない（attach_throttle が効かない）ため、
+    throttle を渡すと送信の前に呼ぶ。
+    """
+    if throttle is not None:
+        throttle()
+    with profiler.span("post_form"):
+        response = context.request.post(
+            form['action'],
+            data=urlencode(form['fields']),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+    if not response.ok:
+        raise RuntimeError(f"HTTP {response.status}")
+    html = response.text()
+    attendance_data = parse_attendance(html)
+    if archive is not None and button_id and attendance_data:
+        archive.record_subject(button_id, html)
+    return attendance_data
+
+def fetch_attendance_direct(page, context, subject_list, latencies=None, throttle=None):
+    """授業一覧ページから離れずに、各授業のフォームを直接送信して取得する
+
+    一覧ページで読み取ったボタンとViewStateをそのまま使うため、授業ごとの
+    list.xhtml の再読み込みが不要になる。送信結果に出席情報がない場合は
+    一覧を読み込み直して1回だけ再送し、それでも駄目ならクリック方式で取得する。
+    結果は取得するたびに subject_list の順に yield する。
+    """
+    forms = collect_subject_forms(page)
+    for i, subject_info in enumerate(subject_list):
+        print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']} を処理中...")
+        started = time.perf_counter()
+        with profiler.span("subject", "subject", subject=subject_info['subject']):
+            attendance_data = []
+            for attempt in range(2):
+                try:
+                    form = forms.get(subject_info['buttonId'])
+                    if form:
+                        attendance_data = post_subject_form(context, form, subject_info['buttonId'], throttle)
+                except Exception as e:
+                    print(f"⚠️ フォーム送信でエラーが発生しました: {str(e)}")
+                if attendance_data or attempt == 1:
+                    break
+                # 一覧が古くなっている（ViewState切れ等）→ 読み込み直す
+                print("⚠️ 授業一覧が古くなっています。再読み込みします...")
+                if open_subject_list_page(page):
+                    forms = collect_subject_forms(page)
+
+        if attendance_data:
+            try:
+                result = summarize_attendance(subject_info, attendance_data)
+            except Exception as e:
+                print(f"❌ エラー: {str(e)}")
+                result = None
+            yield result
+        else:
+            # 従来のクリック方式にフォールバック
+            print("⚠️ 直接送信で取得できませんでした。クリック方式で取得します...")
+            yield get_attendance_for_subject_by_click(page, context, subject_info, i)
+            return_to_subject_list(page, subject_info)
+            forms = collect_subject_forms(page)
+        if latencies is not None:
+            latencies.append(time.perf_counter() - started)
+
+def fetch_subjects_in_page(page, subject_list, concurrency, timeout=None):
+    """一覧ページの中で全授業のフォームを並行して送信する（page.evaluate 1回）
+
+    timeout（秒）を省略すると授業ページの読み込み待ちと同じ上限（実測値と時間予算から決まる）を
+    1件ごとの送信に掛ける。戻り値は buttonId → {data, error, elapsed}。
+    page.evaluate が失敗した場合（ページ遷移等）は、全授業を取得できなかったものとして空の dict を返す。
+    """
+    timeout_ms = int(timeout * 1000) if timeout else latency_tracker.deadline_ms("subject")
+    try:
+        with profiler.span("inpage_batch", subjects=len(subject_list), concurrency=concurrency):
+            return page.evaluate(FETCH_SUBJECTS_IN_PAGE_JS, {
+                "buttonIds": [subject_info['buttonId'] for subject_info in subject_list],
+                "concurrency": concurrency,
+                "timeoutMs": timeout_ms,
+                "keepHtml": archive is not None,
+            })
+    except Exception as e:
+        print(f"⚠️ ページ内の送信中にエラーが発生しました: {str(e)}")
+        return {}
+
+def fetch_attendance_in_page(page, context, subject_list, concurrency=INPAGE_CONCURRENCY, timeout=None,
+                             latencies=None):
+    """授業一覧ページの中から全授業を fetch() でまとめて取得する
+
+    フォームの収集・送信・出席情報の抽出をすべてページ内で行うため、Python とブラウザの
+    往復は1回で済み、全体の所要時間は最も遅い授業1件分に近くなる。同じViewStateで
+    送信するため、保持数を超えて失敗した授業は一覧を読み込み直して1回だけ再送し、
+    それでも駄目ならクリック方式で取得する。結果は subject_list の順に yield する。
+    """
+    print(f"\n⚡ ページ内で{len(subject_list)}件を並行して取得します（同時{concurrency}件）")
+    results = fetch_subjects_in_page(page, subject_list, concurrency, timeout)
+    retry = [subject_info for subject_info in subject_list
+             if not results.get(subject_info['buttonId'], {}).get('data')]
+    if retry:
+        print(f"⚠️ {len(retry)}件を取得できませんでした。授業一覧を読み込み直して再送します...")
+        if open_subject_list_page(page):
+            results.update(fetch_subjects_in_page(page, retry, concurrency, timeout))
+
+    for i, subject_info in enumerate(subject_list):
+        print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']}")
+        outcome = results.get(subject_info['buttonId'], {'data': [], 'error': None, 'elapsed': None})
+        if latencies is not None and outcome['elapsed'] is not None:
+            latencies.append(outcome['elapsed'])
+        if outcome['data']:
+            if archive is not None:
+                archive.record_subject(subject_info['buttonId'], outcome['html'])
+            try:
+                result = summarize_attendance(subject_info, outcome['data'])
+            except Exception as e:
+                print(f"❌ エラー: {str(e)}")
+                result = None
+            yield result
+        else:
+            if outcome['error']:
+                print(f"⚠️ ページ内の送信でエラーが発生しました: {outcome['error']}")
+            print("⚠️ ページ内の送信で取得できませんでした。クリック方式で取得します...")
+            yield get_attendance_for_subject_by_click(page, context, subject_info, i)
+            return_to_subject_list(page, subject_info)
+
+def enable_profiling():
+    """以降の処理の区間を記録する Profiler を有効にして返す"""
+    global profiler
+    profiler = Profiler()
+    return profiler
+
+def enable_archive(root):
+    """以降の取得で HTML を root に保存する HtmlArchive を有効にする（root が None なら無効）"""
+    global archive
+    archive = HtmlArchive(root) if root else None
+    if archive is not None:
+        archive.start_run()
+    return archive
+
+def reset_metrics():
+    """計測結果を初期化（ライブラリとして繰り返し呼ばれた場合に前回分が混ざらないようにする）"""
+    run_metrics.clear()
+    run_metrics.update({"phases": {}, "subject_latencies": []})
+
+def record_phase(name, started):
+    """フェーズの所要時間を計測結果に加算"""
+    run_metrics["phases"][name] = run_metrics["phases"].get(name, 0) + time.perf_counter() - started
+
+def report_latencies(latencies, label):
+    """授業ごとの所要時間を表示"""
+    if not latencies:
+        return
+    run_metrics["subject_latencies"].extend(latencies)
+    run_metrics["label"] = label
+    ordered = sorted(latencies)
+    average = sum(ordered) / len(ordered)
+    median = ordered[len(ordered) // 2]
+    print(f"⏱️ 1件あたりの所要時間 ({label}): 平均{average:.2f}秒 / 中央値{median:.2f}秒 / 最大{ordered[-1]:.2f}秒 ({len(ordered)}件)")
+
+def fetch_attendance_concurrently(page, context, subject_list, concurrency, latencies=None):
+    """同じコンテキストで複数のページを開き、授業を並行して処理する
+
+    Sync APIはスレッドから操作できないため、各ページでクリックだけ先に行い
+    （ブラウザ側で読み込みが並行して進む）、その後ページごとに結果を回収する。
+    結果は回収するたびに subject_list と同じ順序で yield し、失敗した授業は None になる。
+    """
+    concurrency = max(1, min(concurrency, len(subject_list)))
+    pages = [page]
+    for _ in range(concurrency - 1):
+        worker_page = context.new_page()
+        if open_subject_list_page(worker_page):
+            pages.append(worker_page)
+        else:
+            worker_page.close()
+    print(f"🧵 {len(pages)}ページで並行取得します")
+
+    try:
+        for start in range(0, len(subject_list), len(pages)):
+            batch = list(zip(pages, range(start, min(start + len(pages), len(subject_list)))))
+            started = time.perf_counter()
+
+            # 1. 各ページでボタンをクリック（遷移の完了は待たない）
+            clicked = []
+            for worker_page, i in batch:
+                subject_info = subject_list[i]
+                print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']} を処理中...")
+                try:
+                    clicked.append(click_subject_button(worker_page, subject_info))
+                except Exception as e:
+                    print(f"❌ エラー: {str(e)}")
+                    clicked.append(False)
+
+            # 2. 各ページの出席情報を回収
+            for (worker_page, i), ok in zip(batch, clicked):
+                with profiler.span("subject", "subject", subject=subject_list[i]['subject']):
+                    result = read_attendance(worker_page, subject_list[i]) if ok else None
+                yield result
+
+            # 3. 次の授業がある場合、全ページの遷移を開始してから読み込み完了を待つ
+            if start + len(pages) < len(subject_list):
+                for worker_page, i in batch:
+                    return_to_subject_list(worker_page, subject_list[i], wait=False)
+                for worker_page, i in batch:
+                    wait_for_subject_list(worker_page, subject_list[i])
+
+            # 並行取得では1バッチの所要時間を件数で割った実効値を記録する
+            if latencies is not None:
+                elapsed = time.perf_counter() - started
+                latencies.extend([elapsed / len(batch)] * len(batch))
+    finally:
+        for worker_page in pages[1:]:
+            worker_page.close()
 
 def wait_for_new_page(context, timeout=5000):  # 10秒→5秒に短縮
     """新しいタブが開くのを待つ。なければ現在のページを返す."""
     try:
         new_page = context.wait_for_event("page", timeout=timeout)
         print("🔄 新しいタブを検出しました。")
-        new_page.wait_for_load_state("networkidle", timeout=5000)  # 10秒→5秒に短縮
+        with profiler.span("wait_new_page"):
+            new_page.wait_for_load_state("networkidle", timeout=5000)  # 10秒→5秒に短縮
         return new_page
-    except TimeoutError:
+    except PlaywrightTimeoutError:
+        profiler.mark("timeout", where="wait_for_new_page")
         print("🔄 新しいタブは検出されませんでした。現在のページを使用します。")
         return context.pages[-1]
 
-def save_session(context):
-    """セッションクッキーを保存"""
-    storage_state = context.storage_state()
-    with open(SESSION_FILE, "w") as f:
-        json.dump(storage_state, f)
-    print("✅ セッションを保存しました: session.json")
-
-def load_session(context):
-    """セッションクッキーを復元"""
-    if os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, "r") as f:
-            storage_state = json.load(f)
-        context.add_cookies(storage_state["cookies"])
-        print("✅ セッションを復元しました: session.json")
-        return True
-    return False
+def attach_throttle(context, throttle):
+    """ページ本体・フォーム送信のリクエストを送る前に throttle を呼ぶ"""
+    def handle(route):
+        if route.request.resource_type in ("document", "xhr", "fetch"):
+            throttle()
+        route.fallback()
+    context.route("**/*", handle)
 
-# メイン処理の開始
-print("🚀 出席情報取得スクリプトを開始しました")
-
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=False)
-    context = browser.new_context()
-    page = context.new_page()
-
-    # 1. セッションの復元を試みる
-    session_restored = load_session(context)
-
-    # 2. ポータルログインページにアクセス
-    if not session_restored:
-        print("📄 ログインページに移動中...")
-        page.goto("https://myportal.osakac.ac.jp/")
-        page.wait_for_load_state("networkidle")
-        print("✅ ログインページの読み込み完了")
-        print("🔐 Googleログインをブラウザで完了してください。")
-        print("👉 「トップ画面へ」ボタンをクリックして、トップページ(https://myportal.osakac.ac.jp/m/mycontent/list.xhtml)に移動したら Enter を押してください。")
-        input()
-        save_session(context)
-        
-        # ログイン後のページ読み込みを待機
-        try:
-            page.wait_for_load_state("networkidle", timeout=8000)  # 15秒→8秒に短縮
-            print("✅ ログイン後のページ読み込み完了")
-        except TimeoutError:
-            print("⚠️ ログイン後のページ読み込みでタイムアウトしました。続行します...")
-    else:
-        try:
-            print("📄 授業一覧ページに移動中...")
-            page.goto("https://myportal.osakac.ac.jp/m/mycontent/list.xhtml", wait_until="networkidle")
-            page.wait_for_load_state("networkidle", timeout=8000)  # 15秒→8秒に短縮
-            print("✅ 授業一覧ページの読み込み完了")
-        except TimeoutError:
-            print("⚠️ 授業一覧ページの読み込みでタイムアウトしました。続行します...")
-        
-        # ページの内容が完全に読み込まれるまで待機
-        try:
-            page.wait_for_selector("table.main_table", timeout=5000)  # 10秒→5秒に短縮
-            print("✅ 授業一覧テーブルの読み込み完了")
-        except TimeoutError:
-            print("⚠️ 授業一覧テーブルの読み込みでタイムアウトしました。続行します...")
+def save_session(context, session_file=SESSION_FILE):
+    """セッション（クッキーと localStorage 等を含む storage_state）を保存"""
+    save_storage_state(context.storage_state(), session_file)
+    print(f"✅ セッションを保存しました: {session_file}")
 
-    # 3. 新しいタブが開いていたら切り替え
-    page = wait_for_new_page(context)
+def load_session(session_file=SESSION_FILE):
+    """保存済みの storage_state を読み込む（browser.new_context(storage_state=...) に渡す）。なければ None"""
+    storage_state = load_storage_state(session_file)
+    if storage_state is not None:
+        print(f"✅ セッションを復元しました: {session_file}")
+    return storage_state
 
-    # 4. 授業一覧を取得
-    subject_list = get_subject_list(page)
-    
-    if not subject_list:
-        print("❌ 授業一覧が取得できませんでした")
-        browser.close()
-        exit()
-    
-    # 5. 全ての授業の出席情報を取得（クリック方式）
-    print(f"\n🚀 {len(subject_list)}件の授業の出席情報を取得中...")
-    
-    all_attendance_data = []
-    
-    # 各授業の情報に総数を追加
-    for subject_info in subject_list:
-        subject_info['total'] = len(subject_list)
-    
-    # 全ての授業の出席情報を取得（クリック→取得→戻る）
-    success_count = 0
-    for i, subject_info in enumerate(subject_list):
-        print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']} を処理中...")
-        
-        # 授業をクリックして出席情報を取得
-        attendance_result = get_attendance_for_subject_by_click(page, context, subject_info, i)
-        
-        if attendance_result:
-            all_attendance_data.append(attendance_result)
-            success_count += 1
-            print(f"✅ [{i+1}/{len(subject_list)}] 完了")
+def check_session(config, network=True):
+    """ブラウザを起動する前に保存済みセッションを確かめ、VALID / EXPIRED / UNKNOWN を返す"""
+    started = time.perf_counter()
+    with profiler.span("session_probe", network=network):
+        status, reason = probe_session(config.session_file, LIST_URL, timeout=3, network=network,
+                                       throttle=config.throttle)
+    if network or status == EXPIRED:
+        label = {VALID: "有効", EXPIRED: "無効"}.get(status, "不明")
+        print(f"🔑 保存済みセッション: {label}（{reason}、{time.perf_counter() - started:.2f}秒）")
+    run_metrics["session"] = status
+    return status
+
+def open_asset_cache(context, config):
+    """config.asset_cache が指定されていれば静的ファイルのディスクキャッシュを context に登録して返す"""
+    if not config.asset_cache:
+        return None
+    asset_cache = AssetCache(config.asset_cache, int(config.asset_cache_mb * 1024 * 1024))
+    asset_cache.attach(context)
+    return asset_cache
+
+def apply_low_memory(context):
+    """低メモリモード：動画・音声を読み込まず、各ページのHTTPキャッシュを無効にする"""
+    def handle(route):
+        if route.request.resource_type in LOW_MEMORY_BLOCKED_TYPES:
+            route.abort("blockedbyclient")
         else:
-            print(f"❌ [{i+1}/{len(subject_list)}] 失敗")
+            route.fallback()
+
+    def disable_cache(page):
+        try:
+            session = context.new_cdp_session(page)
+            session.send("Network.enable")
+            session.send("Network.setCacheDisabled", {"cacheDisabled": True})
+        except Exception as e:
+            print(f"⚠️ キャッシュを無効にできませんでした: {str(e)}")
+
+    context.route("**/*", handle)
+    context.on("page", disable_cache)
+
+def close_stray_pages(context, page):
+    """page 以外に開いているタブ（ログイン時に残ったもの等）を閉じる"""
+    stray = [other for other in context.pages if other != page]
+    for other in stray:
+        other.close()
+    if stray:
+        print(f"🪶 使っていないタブを{len(stray)}件閉じました")
+
+class PageRecycler:
+    """低メモリモードで、一定の授業数ごとにページを閉じて開き直す（レンダラーのメモリを解放する）"""
+
+    def __init__(self, context, page, every):
+        self.context = context
+        self.page = page
+        self.every = every
+
+    def recycle(self):
+        old_page = self.page
+        with profiler.span("recycle_page"):
+            self.page = self.context.new_page()
+            old_page.close()
+            open_subject_list_page(self.page)
+        print("🪶 ページを開き直しました")
+
+def fetch_with_browser(config, store=None, use_saved_session=True, scheduler=None):
+    """ブラウザで授業一覧と出席情報を取得（セッションがなければログインから）
+
+    config.fast の場合、保存済みセッションがあればヘッドレスで起動し、
+    不要なリソースを遮断する。config.low_memory の場合は省メモリの起動オプションで起動し、
+    キャッシュと動画・音声を無効にして、config.recycle_every 件ごとにページを開き直す。
+    """
+    import_playwright()
+    ttl = timedelta(hours=config.ttl_hours)
+    # ログインが必要な場合は画面操作のため通常モードで起動する
+    saved_session = use_saved_session and os.path.exists(config.session_file)
+    fast = config.fast and saved_session
+    headless = (config.fast or config.low_memory) and saved_session
+    if fast:
+        print("⚡ 高速プロファイルで実行します（ヘッドレス・リソース遮断）")
+    if config.low_memory:
+        print("🪶 低メモリモードで実行します")
+
+    with sync_playwright() as p:
+        # 1. セッションの復元を試みる（クッキーと localStorage 等をまとめてコンテキストに渡す）
+        with profiler.span("session_restore"):
+            storage_state = load_session(config.session_file) if use_saved_session else None
+        session_restored = storage_state is not None
+
+        started = time.perf_counter()
+        with profiler.span("browser_launch"):
+            browser = p.chromium.launch(headless=headless, args=LOW_MEMORY_ARGS if config.low_memory else None)
+            context = browser.new_context(storage_state=storage_state)
+            # 他の route より先に登録する（遮断等の判断を通過したリクエストだけがキャッシュに来る）
+            asset_cache = open_asset_cache(context, config)
+            if config.low_memory:
+                apply_low_memory(context)
+            if fast:
+                resource_monitor = ResourceBlocker(config.blocked_types, config.allowed_hosts)
+            else:
+                resource_monitor = ResourceSizeRecorder()
+            resource_monitor.attach(context)
+            if config.throttle is not None:
+                attach_throttle(context, config.throttle)
+            page = context.new_page()
+        record_phase("browser_launch", started)
+        list_started = time.perf_counter()
+
+        # 2. ポータルログインページにアクセス
+        if not session_restored:
+            if not config.interactive:
+                browser.close()
+                raise SessionExpiredError("ログインが必要です（対話的なログインは無効になっています）")
+            print("📄 ログインページに移動中...")
+            page.goto(PORTAL_URL + "/")
+            page.wait_for_load_state("networkidle")
+            print("✅ ログインページの読み込み完了")
+            print("🔐 Googleログインをブラウザで完了してください。")
+            print(f"👉 「トップ画面へ」ボタンをクリックして、トップページ({LIST_URL})に移動したら Enter を押してください。")
+            input()
+            save_session(context, config.session_file)
         
-        # 授業一覧ページに戻る（最後の授業でない場合）
-        if i < len(subject_list) - 1:
-            print(f"🔄 授業一覧に戻り中...")
+            # ログイン後のページ読み込みを待機
             try:
-                page.goto("https://myportal.osakac.ac.jp/m/mycontent/list.xhtml", wait_until="networkidle")
                 page.wait_for_load_state("networkidle", timeout=8000)  # 15秒→8秒に短縮
-                
-                # 授業一覧テーブルが読み込まれるまで待機
-                page.wait_for_selector("table.main_table", timeout=5000)  # 10秒→5秒に短縮
-                
-                # 次の授業取得まで最小限の待機（500ms→200msに短縮）
-                page.wait_for_timeout(200)
-                
-            except TimeoutError:
-                print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にタイムアウトしました。続行します...")
-            except Exception as e:
-                print(f"⚠️ [{subject_info['subject']}] 授業一覧ページに戻る際にエラーが発生しました: {str(e)}。続行します...")
-    
-    # 6. 結果を表示
-    if all_attendance_data:
-        # 出席情報も曜日・時限で並び替え
-        def sort_attendance_by_day_and_period(item):
-            day_order = {'月': 1, '火': 2, '水': 3, '木': 4, '金': 5, '土': 6, '日': 7}
-            day_and_period = item.get('dayAndPeriod', '')
-            
-            # 4月でない場合、すべて未実施の授業は最後に表示
-            current_date = datetime.now()
-            if current_date.month != 4:
-                all_unimplemented = all(attendance['status'] == '―' for attendance in item.get('attendance_data', []))
-                if all_unimplemented:
-                    return (9999, 9999)  # 最後に表示
-            
-            if not day_and_period:
-                return (999, 999)  # 曜日・時限がない場合は最後に表示
-            
-            day = day_and_period[0]
+                print("✅ ログイン後のページ読み込み完了")
+            except PlaywrightTimeoutError:
+                profiler.mark("timeout", where="fetch_with_browser")
+                print("⚠️ ログイン後のページ読み込みでタイムアウトしました。続行します...")
+        else:
             try:
-                period = int(day_and_period[1:])
-            except ValueError:
-                return (999, 999)
-            
-            return (day_order.get(day, 999), period)
+                print("📄 授業一覧ページに移動中...")
+                started = time.perf_counter()
+                with profiler.span("goto_list"):
+                    page.goto(LIST_URL, wait_until="commit")
+                print("✅ 授業一覧ページの読み込み完了")
+            except PlaywrightTimeoutError:
+                profiler.mark("timeout", where="fetch_with_browser")
+                print("⚠️ 授業一覧ページの読み込みでタイムアウトしました。続行します...")
         
-        all_attendance_data.sort(key=sort_attendance_by_day_and_period)
+            # 授業一覧テーブルが揃うまで待機
+            try:
+                with profiler.span("wait_list"):
+                    wait_until_ready(page, "list", latency_tracker, started)
+                print("✅ 授業一覧テーブルの読み込み完了")
+            except PlaywrightTimeoutError:
+                profiler.mark("timeout", where="fetch_with_browser")
+                print("⚠️ 授業一覧テーブルの読み込みでタイムアウトしました。続行します...")
+
+        # 3. 新しいタブが開いていたら切り替え（ログインした場合のみ）
+        if not session_restored:
+            page = wait_for_new_page(context)
+            if config.low_memory:
+                close_stray_pages(context, page)
+
+        # 4. 授業一覧を取得
+        with profiler.span("extract_list"):
+            subject_list = get_subject_list(page, config.all_terms)
+        if archive is not None:
+            archive.record_list(page.content(), page.url)
+        record_phase("list_load", list_started)
         
-        print("\n" + "="*100)
-        print(f"📊 全授業の出席情報 ({success_count}/{len(subject_list)}件取得成功)")
-        print("="*100)
+        if not subject_list:
+            browser.close()
+            return [], []
         
-        # 最大授業回数を取得してヘッダーを作成（最大13回まで表示）
-        max_lessons = max(len(data['attendance_data']) for data in all_attendance_data) if all_attendance_data else 0
+        # 5. 全ての授業の出席情報を取得（クリック方式）
+        print(f"\n🚀 {len(subject_list)}件の授業の出席情報を取得中...")
         
-        # 通年授業（26回）の場合、前期/後期で分けて表示
-        current_semester = get_current_semester()
-        is_second_semester = "後期" in current_semester
+        # 各授業の情報に総数を追加
+        for subject_info in subject_list:
+            subject_info['total'] = len(subject_list)
         
-        if max_lessons > 13:
-            max_lessons = 13  # 表示は13回まで
+        # 全ての授業の出席情報を取得（クリック→取得→戻る）
+        recycler = PageRecycler(context, page, config.recycle_every) if config.low_memory else None
+
+        def fetch_subjects(subjects):
+            return fetch_subjects_with_browser(page, context, subjects, config, recycler)
+
+        started = time.perf_counter()
+        attendance_results = fetch_with_store(subject_list, fetch_subjects, store, config.incremental, ttl,
+                                              config.on_result, scheduler)
+        record_phase("subjects", started)
+
+        if fast:
+            resource_monitor.report()
         else:
-            max_lessons = min(max_lessons, 13)
-        
-        # 授業名の最大長を計算（曜日・時限も含めて）
-        max_subject_name_length = 0
-        for data in all_attendance_data:
-            if data.get('dayAndPeriod'):
-                # 授業名が15文字以上の場合は省略
-                subject_name = data['subject']
-                if len(subject_name) > 15:
-                    subject_name = subject_name[:15] + "..."
-                display_name = f"{data['dayAndPeriod']} {subject_name}"
+            resource_monitor.save()
+        if asset_cache is not None:
+            asset_cache.save()
+            asset_cache.report()
+        latency_tracker.save()
+
+        # 6. ブラウザを閉じる
+        browser.close()
+    return subject_list, attendance_results
+
+def ensure_subject_list(page):
+    """授業一覧ページが開いていなければ開き直す（再試行の前は授業ページにいることがある）"""
+    if page.query_selector("button[id*='form-list-']") is None:
+        open_subject_list_page(page)
+
+def fetch_subjects_with_browser(page, context, subjects, config, recycler=None):
+    """授業一覧ページを開いた状態から、config.nav / config.concurrency に従って出席情報を取得
+
+    結果は取得するたびに subjects の順に yield する。recycler（PageRecycler）を渡すと
+    page の代わりに recycler.page を使い、recycler.every 件ごとにページを開き直す。
+    """
+    if recycler is not None:
+        for start in range(0, len(subjects), max(1, recycler.every)):
+            if start:
+                recycler.recycle()
+            yield from fetch_subjects_with_browser(recycler.page, context, subjects[start:start + recycler.every],
+                                                   config)
+        return
+    ensure_subject_list(page)
+    latencies = []
+    if config.nav == "direct":
+        results = fetch_attendance_direct(page, context, subjects, latencies, config.throttle)
+        label = "nav=direct"
+    elif config.nav == "inpage":
+        concurrency = config.concurrency if config.concurrency > 1 else INPAGE_CONCURRENCY
+        results = fetch_attendance_in_page(page, context, subjects, concurrency, config.subject_timeout,
+                                           latencies)
+        label = f"nav=inpage concurrency={concurrency}"
+    elif config.concurrency > 1:
+        results = fetch_attendance_concurrently(page, context, subjects, config.concurrency, latencies)
+        label = f"concurrency={config.concurrency}"
+    else:
+        results = fetch_attendance_sequentially(page, context, subjects, config.nav, latencies)
+        label = f"nav={config.nav}"
+    try:
+        yield from results
+    finally:
+        # 途中で閉じられた場合（時間予算切れ等）も、それまでの所要時間を記録する
+        report_latencies(latencies, label)
+
+def fetch_with_store(subject_list, fetch_subjects, store=None, incremental=False, ttl=None, on_result=None,
+                     scheduler=None):
+    """保存済みデータを使える授業を除いて取得し、結果を保存する
+
+    戻り値は subject_list と同じ順序の結果のリスト。on_result を渡すと、
+    結果が得られるたびに on_result(subject_info, result) を呼ぶ（iter_with_store を参照）。
+    """
+    results = {}
+    for subject_info, result in iter_with_store(subject_list, fetch_subjects, store, incremental, ttl, scheduler):
+        results[subject_info['buttonId']] = result
+        if on_result is not None:
+            on_result(subject_info, result)
+    return [results.get(subject_info['buttonId']) for subject_info in subject_list]
+
+def iter_with_store(subject_list, fetch_subjects, store=None, incremental=False, ttl=None, scheduler=None):
+    """保存済みデータと取得結果を、得られた順に (subject_info, result) で yield する
+
+    incremental=True の場合、前回の取得以降に授業時間が終わった授業と、
+    保存から ttl 以上経った授業だけを fetch_subjects で取得し、
+    保存済みデータを使う授業を先に返す。取得した結果はその都度保存する。
+    scheduler（FetchScheduler）を渡すと時間予算・再試行・ブレーカーに従って取得し、
+    取得できなかった授業は保存済みデータがあれば stale=True で返す。
+    """
+    cached = {}
+    to_fetch = subject_list
+    if store is not None and incremental:
+        to_fetch = []
+        for subject_info in subject_list:
+            attendance_data = store.load(subject_info['semester'], subject_info['subject'])
+            fetched_at = store.fetched_at(subject_info['semester'], subject_info['subject'])
+            # 終わった学期の授業は変わらないので、保存済みなら取得しない
+            if attendance_data and (not is_current_term(subject_info['semester'])
+                                    or not is_due(subject_info.get('dayAndPeriod', ''), fetched_at, ttl=ttl)):
+                cached[subject_info['buttonId']] = attendance_data
             else:
-                # 授業名が15文字以上の場合は省略
-                subject_name = data['subject']
-                if len(subject_name) > 15:
-                    subject_name = subject_name[:15] + "..."
-                display_name = subject_name
-            max_subject_name_length = max(max_subject_name_length, len(display_name))
-        
-        # 固定で15文字に設定（出席状況は17字目から表示）
-        max_subject_name_length = 15
-        
-        # ヘッダー行を作成
-        # 「授業名」を15文字幅で正確に配置
-        header_title = "授業名"
-        header_width = get_display_width(header_title)
-        target_width = 30  # 15文字 = 30半角文字分の幅
-        padding_needed = target_width - header_width
-        header = header_title + " " * max(0, padding_needed)
-        header += "　"  # 16字目に全角スペースを追加（全角換算で17字目から開始）
-        for i in range(1, max_lessons + 1):
-            header += f"{i:>3}"
-        header += " 出席 欠席 実施 合計"
-        print(header)
-        print("-" * 100)
-        
-        # 各授業の出席状況を表示
-        for data in all_attendance_data:
-            # 曜日・時限と授業名を組み合わせて表示
-            if data.get('dayAndPeriod'):
-                # 曜日・時限は3文字固定、残り12文字で授業名を表示
-                day_period = data['dayAndPeriod']  # 例：「月1」
-                subject_name = data['subject']
-                
-                # 授業名の表示可能文字数を計算（12文字分の幅）
-                available_width = 24  # 12文字 = 24半角文字分の幅
-                
-                # 文字を1文字ずつ追加して幅を計算
-                truncated_name = ""
-                current_width = 0
-                for char in subject_name:
-                    char_width = get_display_width(char)
-                    if current_width + char_width <= available_width - 6:  # "..."分を考慮
-                        truncated_name += char
-                        current_width += char_width
-                    else:
-                        if truncated_name:  # 文字が切り詰められた場合
-                            truncated_name += "..."
-                        break
-                else:
-                    # 全部入った場合は何もしない
-                    truncated_name = subject_name
-                
-                # 曜日・時限 + スペース + 授業名の形式
-                display_name = f"{day_period} {truncated_name}"
+                to_fetch.append(subject_info)
+        print(f"💾 差分取得: {len(to_fetch)}件を取得、{len(cached)}件は保存済みデータを使用します")
+
+    for subject_info in subject_list:
+        if subject_info['buttonId'] in cached:
+            print(f"\n💾 {subject_info['subject']}: 保存済みデータを使用")
+            yield subject_info, summarize_attendance(subject_info, cached[subject_info['buttonId']])
+
+    freshness = {"fresh": [], "cached": [s['subject'] for s in subject_list if s['buttonId'] in cached],
+                 "stale": [], "missing": []}
+    if to_fetch:
+        if scheduler is not None:
+            fetched = scheduler.run(to_fetch, fetch_subjects)
+        else:
+            fetched = pair_results(to_fetch, fetch_subjects(to_fetch))
+        for subject_info, result in fetched:
+            if result:
+                if store is not None:
+                    store.save(subject_info, result.lessons)
+                freshness["fresh"].append(subject_info['subject'])
+                yield subject_info, result
+                continue
+            # 取得できなかった授業は保存済みの古いデータで補う
+            result = None
+            if store is not None:
+                attendance_data = store.load(subject_info['semester'], subject_info['subject'])
+                if attendance_data:
+                    print(f"\n🟡 {subject_info['subject']}: 取得できなかったため保存済みデータを使用")
+                    result = summarize_attendance(subject_info, attendance_data)
+            if result is None:
+                freshness["missing"].append(subject_info['subject'])
             else:
-                # 曜日・時限がない場合は15文字すべてを授業名に使用
-                subject_name = data['subject']
-                
-                # 15文字分の幅で授業名を調整
-                available_width = 30  # 15文字 = 30半角文字分の幅
-                
-                # 文字を1文字ずつ追加して幅を計算
-                truncated_name = ""
-                current_width = 0
-                for char in subject_name:
-                    char_width = get_display_width(char)
-                    if current_width + char_width <= available_width - 6:  # "..."分を考慮
-                        truncated_name += char
-                        current_width += char_width
-                    else:
-                        if truncated_name:  # 文字が切り詰められた場合
-                            truncated_name += "..."
-                        break
-                else:
-                    # 全部入った場合は何もしない
-                    truncated_name = subject_name
-                
-                display_name = truncated_name
-            
-            # 授業名を15文字ちょうどに調整（全角文字を考慮した固定幅）
-            display_width = get_display_width(display_name)
-            
-            # 15文字分の表示幅にするため、不足分をスペースで埋める
-            target_width = 30  # 15文字 = 30半角文字分の幅
-            padding_needed = target_width - display_width
-            row = display_name + " " * max(0, padding_needed)
-            
-            # 16字目に全角スペースを追加（全角換算で17字目から出席状況開始）
-            row += "　"
-            
-            # 出席状況をマッピング
-            status_map = {}
-            for attendance in data['attendance_data']:
-                lesson_num = int(attendance['lesson'])
-                status = attendance['status']
-                
-                # 通年授業の場合、前期/後期で表示する回数を調整
-                display_lesson_num = lesson_num
-                if len(data['attendance_data']) > 13:  # 通年授業の場合
-                    if is_second_semester:
-                        # 後期の場合、14-26回を1-13回として表示
-                        if lesson_num >= 14:
-                            display_lesson_num = lesson_num - 13
-                        else:
-                            continue  # 前期の回数はスキップ
-                    else:
-                        # 前期の場合、1-13回のみ表示
-                        if lesson_num > 13:
-                            continue  # 後期の回数はスキップ
-                
-                # 表示範囲内の場合のみマッピングに追加
-                if 1 <= display_lesson_num <= 13:
-                    # 状態を記号に変換
-                    if status == '出席':
-                        symbol = '○'
-                    elif status == '欠席':
-                        symbol = '✕'
-                    else:
-                        symbol = '―'
-                    status_map[str(display_lesson_num)] = symbol
-            
-            # 各回の出席状況を表示
-            for i in range(1, max_lessons + 1):
-                lesson_key = str(i)  # 授業回数は文字列として保存されている
-                if lesson_key in status_map:
-                    row += f"{status_map[lesson_key]:>3}"
-                else:
-                    row += "   "  # 該当回がない場合は空白
-            
-            # 集計情報を追加（未実施は除外）
-            implemented_count = data['attendance_count'] + data['absence_count']  # 実施回数 = 出席 + 欠席
-            row += f" {data['attendance_count']:>4} {data['absence_count']:>4} {implemented_count:>4} {data['total_count']:>4}"
-            print(row)
-        
-        print("-" * 100)
-        
-        # 全体の統計情報を表示
-        total_attendance = sum(data['attendance_count'] for data in all_attendance_data)
-        total_absence = sum(data['absence_count'] for data in all_attendance_data)
-        total_implemented = total_attendance + total_absence  # 実施回数 = 出席 + 欠席
-        total_lessons = sum(data['total_count'] for data in all_attendance_data)
-        
-        print("\n" + "="*50)
-        print("📈 全体統計")
-        print("="*50)
-        print(f"総出席回数: {total_attendance}回")
-        print(f"総欠席回数: {total_absence}回")
-        print(f"総実施回数: {total_implemented}回")
-        print(f"総授業回数: {total_lessons}回")
-        if total_implemented > 0:
-            attendance_rate = (total_attendance / total_implemented) * 100
-            print(f"出席率: {attendance_rate:.1f}%")
-        
-        print("\n凡例: ○=出席, ✕=欠席, ―=未実施")
-    else:
-        print("❌ 出席情報を取得できませんでした")
+                result.stale = True
+                freshness["stale"].append(subject_info['subject'])
+            yield subject_info, result
+    report_freshness(freshness)
+
+def pair_results(subjects, results):
+    """subjects と results（fetch_subjects の戻り値）を組にして yield する
+
+    zip と違い、最後の授業の後も results を最後まで読み進める
+    （最後の yield の後にある所要時間の記録・表示を実行させるため）。
+    """
+    for subject_info in subjects:
+        yield subject_info, next(results, None)
+    for _ in results:
+        pass
+
+def report_freshness(freshness):
+    """授業ごとの取得状況（最新・保存済み・古いデータ・取得できず）を表示"""
+    run_metrics["freshness"] = freshness
+    line = (f"📋 取得状況: 最新{len(freshness['fresh'])}件 / 保存済み{len(freshness['cached'])}件 / "
+            f"古いデータ{len(freshness['stale'])}件 / 取得できず{len(freshness['missing'])}件")
+    print("\n" + line)
+    if freshness["stale"]:
+        print(f"🟡 古いデータ: {', '.join(freshness['stale'])}")
+    if freshness["missing"]:
+        print(f"🔴 取得できず: {', '.join(freshness['missing'])}")
+
+def fetch_with_http(config, store=None, scheduler=None):
+    """ブラウザを起動せず、保存済みセッションでHTTPから直接取得
+
+    セッションが無効な場合は SessionExpiredError を送出する。
+    """
+    print("🌐 保存済みセッションでHTTP取得を試みます...")
+    ttl = timedelta(hours=config.ttl_hours)
+    timeout = config.subject_timeout or 10
+    with PortalClient.from_session_file(config.session_file, throttle=config.throttle, timeout=timeout,
+                                        archive=archive) as client:
+        started = time.perf_counter()
+        subject_list = list_subjects_with_http(client, config.all_terms)
+        record_phase("list_load", started)
+        if not subject_list:
+            return [], []
+
+        print(f"\n🚀 {len(subject_list)}件の授業の出席情報を取得中...")
+        for subject_info in subject_list:
+            subject_info['total'] = len(subject_list)
+
+        def fetch_subjects(subjects):
+            return fetch_subjects_with_http(client, subjects)
+
+        started = time.perf_counter()
+        attendance_results = fetch_with_store(subject_list, fetch_subjects, store, config.incremental, ttl,
+                                              config.on_result, scheduler)
+        record_phase("subjects", started)
+    return subject_list, attendance_results
+
+def fetch_subjects_with_http(client, subjects):
+    """PortalClient で授業ごとの出席情報を取得し、取得するたびに subjects の順に yield する
+
+    セッション切れは SessionExpiredError のまま送出する。
+    """
+    latencies = []
+    try:
+        for i, subject_info in enumerate(subjects):
+            print(f"\n🔄 [{i+1}/{len(subjects)}] {subject_info['subject']} を処理中...")
+            started = time.perf_counter()
+            try:
+                with profiler.span("subject", "subject", subject=subject_info['subject']):
+                    attendance_data = client.get_attendance(subject_info['buttonId'])
+                    result = summarize_attendance(subject_info, attendance_data)
+            except SessionExpiredError:
+                raise
+            except Exception as e:
+                print(f"❌ エラー: {str(e)}")
+                result = None
+            latencies.append(time.perf_counter() - started)
+            yield result
+    finally:
+        report_latencies(latencies, "engine=http")
+
+def list_subjects_with_http(client, all_terms=False):
+    """PortalClient で授業一覧を取得し、今学期（all_terms なら全学期）の授業を曜日・時限順に返す"""
+    with profiler.span("http_list"):
+        rows = client.get_subject_rows(LIST_URL)
+    print("✅ 授業一覧ページの読み込み完了")
+    return select_terms(rows, all_terms)
+
+def load_term_from_store(config, on_result=None):
+    """保存済みデータだけから config.term の学期の授業を返す（ポータルには接続しない）
+
+    学期名が config.term で始まる授業（「2025年度前期」なら前期前半・前期後半も）が対象。
+    戻り値は fetch_subjects_and_attendance と同じ (授業一覧, 出席情報のリスト)。
+    """
+    with AttendanceStore(config.store_path) as store:
+        subject_list = [
+            {'semester': semester, 'subject': subject, 'dayAndPeriod': day_and_period, 'buttonId': f"store-{i}"}
+            for i, (semester, subject, day_and_period) in enumerate(store.subjects(config.term))]
+        if not subject_list:
+            print(f"❌ {config.term} の保存済みデータがありません（--backfill で取得してください）")
+            print(f"💾 保存済みの学期: {', '.join(store.semesters()) or 'なし'}")
+            return [], []
+        print(f"💾 {config.term} の授業を保存済みデータから{len(subject_list)}件読み込みます")
+        attendance_results = []
+        for subject_info in subject_list:
+            result = summarize_attendance(
+                subject_info, store.load(subject_info['semester'], subject_info['subject']) or [])
+            attendance_results.append(result)
+            if on_result is not None:
+                on_result(subject_info, result)
+    return subject_list, attendance_results
+
+def replay_archive(config, on_result=None):
+    """保存済みの実行（config.replay）のHTMLから授業一覧と出席情報を解析し直す（ポータルには接続しない）
+
+    対象はその実行で授業ページを保存した授業。戻り値は fetch_subjects_and_attendance と同じ。
+    """
+    html_archive = HtmlArchive(config.archive_dir)
+    try:
+        run = html_archive.load_run(config.replay)
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        return [], []
+    print(f"📼 保存済みの実行 {run['id']} を再現します（{run['created_at']}）")
+    with profiler.span("replay_list"):
+        rows, _ = parse_subject_rows(html_archive.get(run['list']), run['list_url'])
+    subject_list = sort_and_report_subjects(
+        [row for row in rows if row['buttonId'] in run['subjects']], f"実行 {run['id']}")
+
+    attendance_results = []
+    for i, subject_info in enumerate(subject_list):
+        print(f"\n🔄 [{i+1}/{len(subject_list)}] {subject_info['subject']} を処理中...")
+        with profiler.span("subject", "subject", subject=subject_info['subject']):
+            attendance_data = parse_attendance(html_archive.get(run['subjects'][subject_info['buttonId']]))
+            result = summarize_attendance(subject_info, attendance_data)
+        attendance_results.append(result)
+        if on_result is not None:
+            on_result(subject_info, result)
+    return subject_list, attendance_results
+
+def sort_attendance_by_day_and_period(item):
+    """出席情報を曜日・時限で並び替えるためのキー"""
+    day_order = {'月': 1, '火': 2, '水': 3, '木': 4, '金': 5, '土': 6, '日': 7}
+    day_and_period = item.day_and_period
+    
+    # 4月でない場合、すべて未実施の授業は最後に表示
+    current_date = datetime.now()
+    if current_date.month != 4:
+        all_unimplemented = all(attendance.status == '―' for attendance in item.lessons)
+        if all_unimplemented:
+            return (9999, 9999)  # 最後に表示
     
-    # 7. ブラウザを閉じる
-    browser.close()
+    if not day_and_period:
+        return (999, 999)  # 曜日・時限がない場合は最後に表示
+    
+    day = day_and_period[0]
+    try:
+        period = int(day_and_period[1:])
+    except ValueError:
+        return (999, 999)
+    
+    return (day_order.get(day, 999), period)
+
+def print_attendance_table(all_attendance_data, subject_count):
+    """出席情報の一覧表と全体統計を表示（all_attendance_data は並び替え済みであること）"""
+    current_semester = get_current_semester()
+    render.write_table(all_attendance_data, subject_count, sys.stdout, is_second_semester(current_semester[0]))
+
+def fetch_subjects_and_attendance(config=None):
+    """config に従って授業一覧と出席情報を取得する
+
+    戻り値は (授業一覧, 出席情報のリスト)。出席情報は授業一覧と同じ順序で、
+    取得に失敗した授業は None になる。
+    """
+    config = config or FetchConfig()
+    reset_metrics()
+    started = time.perf_counter()
+    if config.term or config.replay:
+        if config.replay:
+            subject_list, attendance_results = replay_archive(config, config.on_result)
+        else:
+            subject_list, attendance_results = load_term_from_store(config, config.on_result)
+        record_phase("fetch", started)
+        return subject_list, attendance_results
+    enable_archive(config.archive_dir if config.archive else None)
+    store = AttendanceStore(config.store_path) if config.store_path else None
+    scheduler = FetchScheduler.from_config(config, latency_tracker)
+    monitor = RssMonitor().start()
+    try:
+        subject_list = None
+        use_saved_session = os.path.exists(config.session_file)
+        # クッキーの有効期限が切れていれば、通信せずにすぐ判断する
+        if use_saved_session and check_session(config, network=False) == EXPIRED:
+            if config.engine == "http" or not config.interactive:
+                raise SessionExpiredError("保存済みセッションの有効期限が切れています")
+            use_saved_session = False
+        if config.engine != "browser" and use_saved_session:
+            try:
+                subject_list, attendance_results = fetch_with_http(config, store, scheduler)
+            except SessionExpiredError as e:
+                print(f"⚠️ 保存済みセッションが無効です: {str(e)}")
+                if config.engine == "http":
+                    raise
+                use_saved_session = False
+            except (OSError, http.client.HTTPException, PortalError) as e:
+                print(f"⚠️ HTTP取得中にエラーが発生しました: {str(e)}")
+                if config.engine == "http":
+                    raise
+        elif config.engine == "http":
+            raise SessionExpiredError(f"{config.session_file} がありません。先に --engine browser でログインしてください")
+
+        if subject_list is None:
+            # ブラウザを起動する前に、保存済みセッションが使えるかを1回のリクエストで確かめる
+            if use_saved_session and check_session(config) == EXPIRED:
+                if not config.interactive:
+                    raise SessionExpiredError("保存済みセッションが無効です（対話的なログインは無効になっています）")
+                use_saved_session = False
+            subject_list, attendance_results = fetch_with_browser(config, store, use_saved_session, scheduler)
+    finally:
+        monitor.stop()
+        run_metrics["peak_rss_mb"] = monitor.peak_mb
+        monitor.report()
+        if store is not None:
+            store.close()
+        if archive is not None:
+            path = archive.save_run()
+            if path:
+                print(f"📼 取得したHTMLを保存しました: {path}")
+    record_phase("fetch", started)
+    return subject_list, attendance_results
+
+def fetch_attendance(config=None):
+    """出席情報を取得し、曜日・時限順に並べた SubjectAttendance のリストを返す
+
+    ライブラリとして使う場合の入口。ブラウザが必要になった場合のみ Playwright を読み込む。
+    """
+    _, attendance_results = fetch_subjects_and_attendance(config)
+    return sorted((result for result in attendance_results if result),
+                  key=sort_attendance_by_day_and_period)
+
+def add_fetch_arguments(parser):
+    """取得方法に関する引数の定義（main.py・daemon.py・watch.py 共通）"""
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="同時に開くページ数（1なら従来どおり1件ずつ処理）")
+    parser.add_argument("--engine", choices=["auto", "browser", "http"], default="auto",
+                        help="取得方法（auto: 保存済みセッションがあればHTTP、無効ならブラウザ）")
+    parser.add_argument("--nav", choices=["reload", "back", "direct", "inpage"], default="reload",
+                        help="授業間の移動方法（reload: 毎回一覧を再読み込み、back: 履歴で戻る、direct: 一覧から直接フォーム送信、"
+                             "inpage: 一覧ページ内から全授業を並行して送信）")
+    parser.add_argument("--fast", action="store_true",
+                        help="高速プロファイル（ログイン済みならヘッドレス、不要なリソースを遮断）")
+    parser.add_argument("--block-types", default=",".join(DEFAULT_BLOCKED_TYPES),
+                        help="高速プロファイルで遮断するリソース種別（カンマ区切り）")
+    parser.add_argument("--allow-hosts", default=",".join(DEFAULT_ALLOWED_HOSTS),
+                        help="高速プロファイルで通信を許可するホスト（カンマ区切り）")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="低メモリモード（ログイン済みならヘッドレス、省メモリの起動オプション、キャッシュ無効、ページを定期的に開き直す）")
+    parser.add_argument("--recycle-every", type=int, default=20,
+                        help="低メモリモードでページを開き直す間隔（授業数）")
+    parser.add_argument("--asset-cache", nargs="?", const=ASSET_CACHE_DIR, default=None, metavar="DIR",
+                        help="ポータルのスクリプト・CSS・画像をディスクにキャッシュし、次回以降はそこから返す")
+    parser.add_argument("--asset-cache-mb", type=float, default=50,
+                        help="ディスクキャッシュの上限（MB、超えたら古く使われていないものから削除）")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="授業の取得全体の時間予算（秒）。超えた授業は取得せず保存済みデータを使う")
+    parser.add_argument("--subject-timeout", type=float, default=None,
+                        help="授業1件の読み込み待ちの上限（秒）")
+    parser.add_argument("--retries", type=int, default=1,
+                        help="失敗した授業を最後に再試行する回数")
+    parser.add_argument("--backoff", type=float, default=1.0,
+                        help="再試行までの待ち時間（秒、回ごとに2倍）")
+    parser.add_argument("--breaker", type=int, default=3,
+                        help="この件数連続で失敗したら取得を中止する（サーキットブレーカー）")
+    parser.add_argument("--session-file", default=SESSION_FILE,
+                        help="セッションの保存先")
+    return parser
+
+def build_arg_parser():
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(description="OECU 出席情報取得スクリプト")
+    add_fetch_arguments(parser)
+    parser.add_argument("--incremental", action="store_true",
+                        help="授業時間が終わった授業と期限切れの授業だけを取得し、他は保存済みデータを使う")
+    parser.add_argument("--ttl-hours", type=float, default=24 * 7,
+                        help="差分取得で保存済みデータを使う最大の経過時間（時間）")
+    parser.add_argument("--backfill", action="store_true",
+                        help="一覧にある全学期（前半・後半・通年を含む）の授業を取得して保存する")
+    parser.add_argument("--term", default=None,
+                        help="指定した学期（例: 2025年度前期）を保存済みデータだけから表示する（ポータルに接続しない）")
+    parser.add_argument("--archive", action="store_true",
+                        help="取得した一覧と授業ページのHTMLを --archive-dir に保存する（同じ内容は1回だけ）")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                        help="HTMLの保存先")
+    parser.add_argument("--replay", nargs="?", const="latest", default=None, metavar="RUN",
+                        help="保存済みの実行（省略時は最新）のHTMLから解析・表示だけをやり直す（ポータルに接続しない）")
+    parser.add_argument("--store", default=STORE_FILE,
+                        help="出席情報の保存先（SQLite）")
+    parser.add_argument("--format", choices=render.OUTPUT_FORMATS, default="table",
+                        help="結果の出力形式（table: 端末向けの表、json/ndjson/csv: 他のツール向け）")
+    parser.add_argument("--output", default="-",
+                        help="結果の出力先（- なら標準出力。table 以外を標準出力に出す場合、進捗は標準エラーに出す）")
+    parser.add_argument("--stream", action="store_true",
+                        help="授業ごとに取得した時点で結果を出力する（表の場合、並び替えた一覧は最後に表示）")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="フェーズごとの所要時間を PREFIX.json と PREFIX.trace.json（Chromeのトレース形式）に書き出す")
+    parser.add_argument("--history", default=None, metavar="DIR",
+                        help="取得結果を出席履歴（analytics.py で分析する配列）に追記する。アカウント名はセッションファイル名")
+    parser.add_argument("--metrics-out", default=None,
+                        help="実行時間・フェーズ別時間・授業ごとの所要時間をJSONで書き出すファイル")
+    return parser
+
+def fetch_options(args):
+    """add_fetch_arguments で定義した引数を FetchConfig の引数にする"""
+    return {
+        "engine": args.engine,
+        "concurrency": args.concurrency,
+        "nav": args.nav,
+        "fast": args.fast,
+        "blocked_types": [t for t in args.block_types.split(",") if t],
+        "allowed_hosts": [h for h in args.allow_hosts.split(",") if h],
+        "session_file": args.session_file,
+        "budget": args.budget,
+        "subject_timeout": args.subject_timeout,
+        "retries": args.retries,
+        "backoff": args.backoff,
+        "breaker_threshold": args.breaker,
+        "low_memory": args.low_memory,
+        "recycle_every": args.recycle_every,
+        "asset_cache": args.asset_cache,
+        "asset_cache_mb": args.asset_cache_mb,
+    }
+
+def config_from_args(args):
+    """コマンドライン引数（build_arg_parser）から FetchConfig を作る"""
+    return FetchConfig(
+        **fetch_options(args),
+        incremental=args.incremental,
+        ttl_hours=args.ttl_hours,
+        store_path=args.store,
+        all_terms=args.backfill,
+        term=args.term,
+        archive=args.archive,
+        archive_dir=args.archive_dir,
+        replay=args.replay,
+    )
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    # 機械向けの形式を標準出力に出す場合は、進捗の表示を標準エラーに回す
+    if args.format != "table" and args.output == "-":
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, sys.__stdout__)
+    if args.output != "-":
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            return run(args, out)
+    return run(args, sys.stdout)
+
+def run(args, out):
+    """コマンドライン引数に従って取得し、結果を out に書き出す"""
+    # メイン処理の開始
+    print("🚀 出席情報取得スクリプトを開始しました")
+    run_started = time.perf_counter()
+    if args.profile:
+        enable_profiling()
+
+    current_semester = get_current_semester()
+    second_semester = is_second_semester(args.term or current_semester[0])
+    config = config_from_args(args)
+    stream = render.StreamWriter(out, args.format, second_semester) if args.stream else None
+    first_result = None
+
+    def on_result(subject_info, result):
+        nonlocal first_result
+        if first_result is None:
+            first_result = time.perf_counter() - run_started
+        if result and stream is not None:
+            stream.write(result)
+
+    config.on_result = on_result
+    try:
+        subject_list, attendance_results = fetch_subjects_and_attendance(config)
+    except SessionExpiredError as e:
+        print(f"❌ {str(e)}")
+        return 1
+    except (OSError, http.client.HTTPException, PortalError) as e:
+        print(f"❌ HTTP取得中にエラーが発生しました: {str(e)}")
+        return 1
+
+    if not subject_list:
+        print("❌ 授業一覧が取得できませんでした")
+        return 1
+
+    all_attendance_data = []
+    for i, attendance_result in enumerate(attendance_results):
+        if attendance_result:
+            all_attendance_data.append(attendance_result)
+            print(f"✅ [{i+1}/{len(subject_list)}] 完了")
+        else:
+            print(f"❌ [{i+1}/{len(subject_list)}] 失敗")
+
+    # 6. 結果を表示
+    render_started = time.perf_counter()
+    with profiler.span("render"):
+        if config.all_terms or config.term or config.replay:
+            # 複数の学期を含む場合は学期ごとにまとめる
+            all_attendance_data.sort(key=lambda item: (item.semester, sort_attendance_by_day_and_period(item)))
+        else:
+            all_attendance_data.sort(key=sort_attendance_by_day_and_period)
+        if stream is not None:
+            stream.close(all_attendance_data, len(subject_list))
+        else:
+            render.write_results(all_attendance_data, out, args.format, len(subject_list), second_semester)
+    record_phase("render", render_started)
+
+    if args.history and not (args.term or args.replay):
+        account = os.path.splitext(os.path.basename(args.session_file))[0]
+        history = analytics.append_run(args.history, [data for data in all_attendance_data if not data.stale], account)
+        print(f"📈 出席履歴に追記しました: {args.history}（{len(history)}件）")
+
+    if args.profile:
+        profiler.save_json(args.profile + ".json")
+        profiler.save_chrome_trace(args.profile + ".trace.json")
+        print(f"\n{profiler.summary()}")
+        print(f"✅ プロファイルを保存しました: {args.profile}.json, {args.profile}.trace.json")
+
+    if args.metrics_out:
+        run_metrics["wall"] = time.perf_counter() - run_started
+        run_metrics["first_result"] = first_result
+        run_metrics["subjects"] = len(subject_list)
+        run_metrics["success"] = len(all_attendance_data)
+        with open(args.metrics_out, "w") as f:
+            json.dump(run_metrics, f, ensure_ascii=False, indent=2)
+
+    print("\n✅ 処理完了!")
+    return 0
 
-print("\n✅ 処理完了!")
\ No newline at end of file
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,307 @@
+"""ポータル（myportal.osakac.ac.jp）のオフライン代替サーバー
+
+list.xhtml（table.main_table / td.hide_xs / td.mb_disp / form-list-* ボタン）と、
+ボタンのフォーム送信で返る授業ページ（div.contents_state）を固定データで再現する。
+応答の遅延・ばらつき・授業数・通年授業（26回）の数を指定できる。
+
+    python mock_portal.py --port 8080 --subjects 12 --full-year 2 --latency 0.3 --jitter 0.1
+
+main.py は環境変数 OECU_PORTAL_URL=http://127.0.0.1:8080 で接続先を切り替えられる。
+クッキー JSESSIONID=mock-session が付いていないリクエストはログインページに転送する。
+"""
+import argparse
+import html
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LIST_PATH = "/m/mycontent/list.xhtml"
+SESSION_COOKIE = "JSESSIONID"
+SESSION_VALUE = "mock-session"
+VIEW_STATE_NAME = "javax.faces.ViewState"
+
+# JSFと同様、セッションごとに保持するViewStateの数
+MAX_VIEW_STATES = 20
+
+SUBJECT_NAMES = [
+    "線形代数学", "微分積分学", "プログラミング演習", "データ構造とアルゴリズム",
+    "電気回路", "電子回路", "情報ネットワーク", "オペレーティングシステム",
+    "English Communication", "キャリアデザイン", "確率統計", "データベース",
+    "ソフトウェア工学", "計算機アーキテクチャ", "情報セキュリティ", "人工知能概論",
+]
+
+DAYS = "月火水木金"
+
+# 静的ファイル（高速プロファイル・キャッシュの検証用）
+STATIC_FILES = {
+    "/resources/portal.css": ("text/css", b"body{font-family:sans-serif}\n" * 400),
+    "/resources/portal.js": ("application/javascript", b"window.portalReady=true;\n" * 400),
+    "/resources/logo.png": ("image/png", b"\x89PNG\r\n\x1a\n" + b"\0" * 20000),
+    "/resources/attend.png": ("image/png", b"\x89PNG\r\n\x1a\n" + b"\0" * 2000),
+}
+
+
+def current_semesters(now=None):
+    """main.py の get_current_semester と同じ規則の学期名"""
+    now = now or datetime.now()
+    term = "前期" if 3 <= now.month <= 8 else "後期"
+    return [f"{now.year}年度{term}", f"{now.year}年度{term}前半", f"{now.year}年度{term}後半"]
+
+
+def build_fixture(subjects=12, full_year=2, other_terms=3, held=None, seed=0, now=None):
+    """授業一覧と各授業の出席状況を生成する
+
+    subjects は現学期の授業数（うち full_year 件は26回の通年授業）、
+    other_terms は一覧に混ざる前学期の授業数、held は実施済みの回数（既定は学期の経過から推定）。
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    semesters = current_semesters(now)
+    if held is None:
+        start_month = 4 if 3 <= now.month <= 8 else 10
+        held = max(0, min(13, ((now.month - start_month) % 12) * 4 + now.day // 7))
+    previous = f"{now.year - 1 if now.month < 9 else now.year}年度{'後期' if '前期' in semesters[0] else '前期'}"
+
+    rows = []
+    for i in range(subjects + other_terms):
+        current = i < subjects
+        name = SUBJECT_NAMES[i % len(SUBJECT_NAMES)]
+        if i >= len(SUBJECT_NAMES):
+            name += f"（{i // len(SUBJECT_NAMES) + 1}）"
+        lessons = 26 if current and i < full_year else 13
+        semester = semesters[0] if lessons == 26 else (rng.choice(semesters) if current else previous)
+        with_slot = i % 7 != 6  # 一部は曜日・時限なし（集中講義など）
+        done = held + (13 if lessons == 26 and "後期" in semester else 0) if current else lessons
+        statuses = []
+        for lesson in range(1, lessons + 1):
+            if lesson <= done:
+                statuses.append("出席" if rng.random() < 0.85 else "欠席")
+            else:
+                statuses.append("―")
+        rows.append({
+            "semester": semester,
+            "subject": name,
+            "day": DAYS[i % len(DAYS)] if with_slot else "",
+            "period": (i % 5) + 1 if with_slot else 0,
+            "statuses": statuses,
+        })
+    return rows
+
+
+def render_list(rows, view_state):
+    body = []
+    for i, row in enumerate(rows):
+        day = f"{row['day']}曜日" if row["day"] else ""
+        period = f"{row['period']}時限" if row["period"] else ""
+        body.append(f"""
+<tr>
+  <td class="hide_xs">{html.escape(row['semester'])}</td>
+  <td class="mb_disp">{html.escape(row['subject'])}</td>
+  <td>{day}</td>
+  <td>{period}</td>
+  <td>
+    <form id="form-list-{i}" name="form-list-{i}" method="post" action="{LIST_PATH}">
+      <input type="hidden" name="form-list-{i}" value="form-list-{i}" />
+      <button id="form-list-{i}:open" name="form-list-{i}:open" type="submit">詳細</button>
+      <input type="hidden" name="{VIEW_STATE_NAME}" value="{view_state}" />
+    </form>
+  </td>
+</tr>""")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>授業一覧</title>
+<link rel="stylesheet" href="/resources/portal.css">
+<script src="/resources/portal.js"></script></head>
+<body><img src="/resources/logo.png" alt="logo">
+<table class="main_table"><thead><tr><th>学期</th><th>授業名</th><th>曜日</th><th>時限</th><th></th></tr></thead>
+<tbody>{''.join(body)}
+</tbody></table></body></html>"""
+
+
+def render_subject(row, view_state):
+    items = []
+    for lesson, status in enumerate(row["statuses"], start=1):
+        if status == "―":
+            mark = "<div>―</div>"
+        else:
+            mark = f'<img src="/resources/attend.png" title="{status}" alt="{status}">'
+        items.append(f"""
+<div class="contents_state"><div class="contents_name">{lesson}</div>{mark}</div>""")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(row['subject'])}</title>
+<link rel="stylesheet" href="/resources/portal.css"></head>
+<body><h1>{html.escape(row['subject'])}</h1>
+<form id="form-back" method="post" action="{LIST_PATH}">
+<input type="hidden" name="{VIEW_STATE_NAME}" value="{view_state}" /></form>
+{''.join(items)}
+</body></html>"""
+
+
+LOGIN_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>ログイン</title></head>
+<body><p>ログインしてください（オフライン代替サーバー）</p>
+<a href="/login">ログイン</a></body></html>"""
+
+
+class MockPortal:
+    """代替サーバーの状態（固定データ・遅延・発行済みViewState）"""
+
+    def __init__(self, rows, latency=0.0, jitter=0.0, seed=0, error_rate=0.0):
+        self.rows = rows
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.view_states = []
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def delay(self):
+        with self.lock:
+            self.request_count += 1
+            wait = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+    def should_fail(self):
+        """授業ページの送信を error_rate の確率で失敗させる（再試行の確認用）"""
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def new_view_state(self):
+        token = secrets.token_hex(8)
+        with self.lock:
+            self.view_states.append(token)
+            del self.view_states[:-MAX_VIEW_STATES]
+        return token
+
+    def valid_view_state(self, token):
+        with self.lock:
+            return token in self.view_states
+
+
+def make_handler(portal):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # ヘッダーと本文をまとめて送る（Nagle + 遅延ACKによる待ちを避ける）
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="text/html; charset=utf-8", headers=()):
+            data = body.encode("utf-8") if isinstance(body, str) else body
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        def _logged_in(self):
+            cookies = self.headers.get("Cookie", "")
+            return f"{SESSION_COOKIE}={SESSION_VALUE}" in [c.strip() for c in cookies.split(";")]
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path in STATIC_FILES:
+                content_type, data = STATIC_FILES[path]
+                etag = f'"{len(data)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", content_type, [("ETag", etag)])
+                    return
+                self._send(200, data, content_type, [("Cache-Control", "max-age=3600"), ("ETag", etag)])
+                return
+            if path == "/login":
+                self._send(302, "", headers=[("Location", LIST_PATH),
+                                             ("Set-Cookie", f"{SESSION_COOKIE}={SESSION_VALUE}; Path=/")])
+                return
+            if path == LIST_PATH:
+                portal.delay()
+                if not self._logged_in():
+                    self._send(302, "", headers=[("Location", "/")])
+                    return
+                self._send(200, render_list(portal.rows, portal.new_view_state()))
+                return
+            if path == "/":
+                self._send(200, LOGIN_PAGE)
+                return
+            self._send(404, "not found", "text/plain")
+
+        do_HEAD = do_GET
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            if path != LIST_PATH:
+                self._send(404, "not found", "text/plain")
+                return
+            portal.delay()
+            if not self._logged_in():
+                self._send(302, "", headers=[("Location", "/")])
+                return
+            view_state = (form.get(VIEW_STATE_NAME) or [""])[0]
+            index = next((int(name.split(":")[0].rsplit("-", 1)[1]) for name in form
+                          if name.startswith("form-list-") and name.endswith(":open")), None)
+            if portal.should_fail():
+                self._send(500, "internal server error", "text/plain")
+                return
+            if not portal.valid_view_state(view_state) or index is None or index >= len(portal.rows):
+                # ViewExpired 相当：一覧を返す
+                self._send(200, render_list(portal.rows, portal.new_view_state()))
+                return
+            self._send(200, render_subject(portal.rows[index], portal.new_view_state()))
+
+    return Handler
+
+
+def start_server(port=0, subjects=12, full_year=2, other_terms=3, latency=0.0, jitter=0.0,
+                 held=None, seed=0, error_rate=0.0):
+    """別スレッドで代替サーバーを起動し、(server, portal) を返す（port=0 なら空きポート）"""
+    rows = build_fixture(subjects, full_year, other_terms, held, seed)
+    portal = MockPortal(rows, latency, jitter, seed, error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(portal))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, portal
+
+
+def session_state(server):
+    """代替サーバー用の session.json の内容（Playwright の storage_state 形式）"""
+    return {
+        "cookies": [{
+            "name": SESSION_COOKIE, "value": SESSION_VALUE, "domain": server.server_address[0],
+            "path": "/", "expires": -1, "httpOnly": True, "secure": False, "sameSite": "Lax",
+        }],
+        "origins": [],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ポータルのオフライン代替サーバー")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--subjects", type=int, default=12, help="現学期の授業数")
+    parser.add_argument("--full-year", type=int, default=2, help="うち通年授業（26回）の数")
+    parser.add_argument("--other-terms", type=int, default=3, help="一覧に混ざる他学期の授業数")
+    parser.add_argument("--held", type=int, default=None, help="実施済みの回数（既定は日付から推定）")
+    parser.add_argument("--latency", type=float, default=0.0, help="HTMLの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="応答遅延のばらつき（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="授業ページの送信が失敗する確率")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.port, args.subjects, args.full_year, args.other_terms,
+                             args.latency, args.jitter, args.held, args.seed, args.error_rate)
+    print(f"🧪 代替ポータルを起動しました: http://127.0.0.1:{server.server_address[1]}{LIST_PATH}")
+    print("   Ctrl+C で終了")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
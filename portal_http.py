@@ -0,0 +1,425 @@
+"""ブラウザを使わずにポータルから授業一覧・出席情報を取得するHTTPクライアント
+
+session.json に保存されたクッキーを使い、1本のkeep-alive接続で
+list.xhtml の取得と各授業ボタン（JSFフォーム）のPOSTを再現する。
+HTMLの解析は標準ライブラリの html.parser で行い、
+main.py の page.evaluate と同じ結果（辞書のリスト）を返す。
+"""
+import gzip
+import http.client
+import json
+import re
+import time
+from html.parser import HTMLParser
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urljoin, urlsplit
+
+VIEW_STATE_NAME = "javax.faces.ViewState"
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+# 子要素を持たない（終了タグのない）要素
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                 "link", "meta", "param", "source", "track", "wbr"}
+
+
+class SessionExpiredError(Exception):
+    """保存済みセッションが無効（ログインページにリダイレクトされた等）"""
+
+
+class PortalError(RuntimeError):
+    """ポータルがエラーを返した（HTTP 5xx 等）、またはリダイレクトが終わらない"""
+
+
+# ---------------------------------------------------------------------------
+# HTMLの解析
+# ---------------------------------------------------------------------------
+
+class Element:
+    """解析済みHTMLの要素（querySelector相当の最低限の操作のみ）"""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def has_class(self, name):
+        return name in (self.attrs.get("class") or "").split()
+
+    def iter(self):
+        """子孫要素を文書順に返す（自身は含まない）"""
+        for child in self.children:
+            if isinstance(child, Element):
+                yield child
+                yield from child.iter()
+
+    def find_all(self, tag=None, cls=None, pred=None):
+        for el in self.iter():
+            if tag and el.tag != tag:
+                continue
+            if cls and not el.has_class(cls):
+                continue
+            if pred and not pred(el):
+                continue
+            yield el
+
+    def find(self, tag=None, cls=None, pred=None):
+        return next(self.find_all(tag, cls, pred), None)
+
+    def text(self):
+        """textContent 相当"""
+        parts = []
+        for child in self.children:
+            parts.append(child.text() if isinstance(child, Element) else child)
+        return "".join(parts)
+
+    def ancestor(self, tag):
+        el = self.parent
+        while el is not None and el.tag != tag:
+            el = el.parent
+        return el
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        el = Element(tag, {k: (v if v is not None else "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(el)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(el)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        # 閉じ忘れがあっても対応する開始タグまで戻る（なければ無視）
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def _form_fields(form):
+    """フォームの送信値を (name, value) のリストで返す（ボタンは含まない）"""
+    fields = []
+    for el in form.iter():
+        name = el.get("name")
+        if not name or "disabled" in el.attrs:
+            continue
+        if el.tag == "input":
+            input_type = el.get("type", "text").lower()
+            if input_type in ("submit", "button", "image", "reset", "file"):
+                continue
+            if input_type in ("checkbox", "radio") and "checked" not in el.attrs:
+                continue
+            fields.append((name, el.get("value", "")))
+        elif el.tag == "textarea":
+            fields.append((name, el.text()))
+        elif el.tag == "select":
+            options = list(el.find_all("option"))
+            selected = [o for o in options if "selected" in o.attrs] or options[:1]
+            for option in selected:
+                fields.append((name, option.get("value", option.text().strip())))
+    return fields
+
+
+def _find_view_state(root):
+    el = root.find("input", pred=lambda e: e.get("name") == VIEW_STATE_NAME)
+    return el.get("value") if el is not None else None
+
+
+def parse_subject_rows(html, base_url):
+    """list.xhtml から授業一覧（全学期）と各ボタンのフォーム情報を取得
+
+    戻り値は (rows, forms)。rows は get_subject_list の page.evaluate と同じ形式、
+    forms は buttonId → {"action", "fields"} の辞書。
+    """
+    root = parse_html(html)
+    rows = []
+    forms = {}
+    tr_list = [tr for table in root.find_all("table", "main_table")
+               for tr in table.find_all("tr") if tr.ancestor("tbody") is not None]
+    for index, tr in enumerate(tr_list):
+        semester_cell = tr.find("td", "hide_xs")
+        subject_cell = tr.find("td", "mb_disp")
+        button = tr.find("button", pred=lambda e: "form-list-" in e.get("id", ""))
+        if not (semester_cell and subject_cell and button):
+            continue
+
+        # 曜日と時限を取得
+        day = ""
+        period = ""
+        for cell in tr.find_all("td"):
+            text = cell.text().strip()
+            if re.fullmatch(r"[月火水木金土日]曜日", text):
+                day = text.replace("曜日", "")
+            if re.fullmatch(r"[0-9]+時限", text):
+                period = text.replace("時限", "")
+
+        button_id = button.get("id")
+        rows.append({
+            "semester": semester_cell.text().strip(),
+            "subject": subject_cell.text().strip(),
+            "buttonId": button_id,
+            "dayAndPeriod": day + period if day and period else "",
+            "index": index,
+        })
+
+        # ボタンが属するフォーム（JSFではボタンIDの「:」より前がフォームID）
+        form = button.ancestor("form")
+        if form is None:
+            form_id = button_id.split(":")[0]
+            form = root.find("form", pred=lambda e: e.get("id") == form_id)
+        if form is None:
+            continue
+        name = button.get("name") or button_id
+        fields = _form_fields(form)
+        fields.append((name, button.get("value") or name))
+        forms[button_id] = {
+            "action": urljoin(base_url, form.get("action") or base_url),
+            "fields": fields,
+        }
+    return rows, forms
+
+
+def parse_attendance(html):
+    """授業ページから出席情報を取得（read_attendance の page.evaluate と同じ形式）"""
+    root = parse_html(html)
+    results = []
+    for el in root.find_all("div", "contents_state"):
+        lesson_number_el = el.find("div", "contents_name")
+        if lesson_number_el is None:
+            continue
+        img = el.find("img")
+        status = "―"
+        if img is not None and img.get("title"):
+            status = img.get("title")
+        results.append({"lesson": lesson_number_el.text().strip(), "status": status})
+    return results
+
+
+def has_subject_table(html):
+    return 'main_table' in html and parse_html(html).find("table", "main_table") is not None
+
+
+# ---------------------------------------------------------------------------
+# HTTPクライアント
+# ---------------------------------------------------------------------------
+
+class PortalClient:
+    """保存済みクッキーで list.xhtml と授業ページを取得するクライアント
+
+    ホストごとに1本の接続を使い回す（keep-alive）。
+    throttle を渡すと、リクエストを送る前に毎回呼ぶ（レート制限用）。
+    archive（archive.HtmlArchive）を渡すと、取得した一覧と授業ページのHTMLを保存する。
+    """
+
+    def __init__(self, cookies, timeout=10, throttle=None, archive=None):
+        self.cookies = [dict(c) for c in cookies]
+        self.timeout = timeout
+        self.throttle = throttle
+        self.archive = archive
+        self.view_state = None
+        self._connections = {}
+        self._forms = {}
+        self._list_url = None
+
+    @classmethod
+    def from_session_file(cls, path, **kwargs):
+        with open(path, "r") as f:
+            storage_state = json.load(f)
+        return cls(storage_state.get("cookies", []), **kwargs)
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # クッキー -------------------------------------------------------------
+
+    def _cookie_header(self, url):
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        path = parts.path or "/"
+        now = time.time()
+        pairs = []
+        for c in self.cookies:
+            domain = (c.get("domain") or host).lstrip(".")
+            if host != domain and not host.endswith("." + domain):
+                continue
+            if not path.startswith(c.get("path") or "/"):
+                continue
+            if c.get("secure") and parts.scheme != "https":
+                continue
+            expires = c.get("expires", -1)
+            if expires not in (None, -1) and expires < now:
+                continue
+            pairs.append(f"{c['name']}={c['value']}")
+        return "; ".join(pairs)
+
+    def _store_cookies(self, url, headers):
+        host = urlsplit(url).hostname
+        for header in headers:
+            jar = SimpleCookie()
+            try:
+                jar.load(header)
+            except Exception:
+                continue
+            for name, morsel in jar.items():
+                domain = morsel["domain"] or host
+                path = morsel["path"] or "/"
+                self.cookies = [c for c in self.cookies
+                                if not (c["name"] == name and c.get("domain", "").lstrip(".") == domain.lstrip(".")
+                                        and c.get("path", "/") == path)]
+                expires = -1
+                if morsel["max-age"]:
+                    expires = time.time() + int(morsel["max-age"])
+                self.cookies.append({
+                    "name": name, "value": morsel.value, "domain": domain, "path": path,
+                    "expires": expires, "secure": bool(morsel["secure"]),
+                })
+
+    # 通信 -----------------------------------------------------------------
+
+    def _connection(self, parts):
+        key = (parts.scheme, parts.netloc)
+        conn = self._connections.get(key)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(parts.netloc, timeout=self.timeout)
+            self._connections[key] = conn
+        return conn
+
+    def _send(self, method, url, body=None, content_type=None):
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+        cookie = self._cookie_header(url)
+        if cookie:
+            headers["Cookie"] = cookie
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.throttle is not None:
+            self.throttle()
+
+        # 切断済みの接続を使い回した場合は1回だけ張り直す
+        for attempt in range(2):
+            conn = self._connection(parts)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest):
+                conn.close()
+                self._connections.pop((parts.scheme, parts.netloc), None)
+                if attempt == 1:
+                    raise
+        if response.getheader("Connection", "").lower() == "close":
+            conn.close()
+            self._connections.pop((parts.scheme, parts.netloc), None)
+
+        self._store_cookies(url, response.msg.get_all("Set-Cookie") or [])
+        if response.getheader("Content-Encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        charset = response.msg.get_content_charset() or "utf-8"
+        return response.status, response.getheader("Location"), data.decode(charset, errors="replace")
+
+    def request(self, method, url, fields=None, max_redirects=5):
+        """リクエストを送り、リダイレクトを辿った最終的な (URL, HTML) を返す"""
+        body = urlencode(fields).encode() if fields is not None else None
+        content_type = "application/x-www-form-urlencoded" if fields is not None else None
+        for _ in range(max_redirects + 1):
+            status, location, html = self._send(method, url, body, content_type)
+            if status in (301, 302, 303, 307, 308) and location:
+                next_url = urljoin(url, location)
+                if urlsplit(next_url).netloc != urlsplit(url).netloc:
+                    # 別ホスト（Googleログイン等）へのリダイレクトはセッション切れとみなす
+                    raise SessionExpiredError(f"ログインページにリダイレクトされました: {next_url}")
+                url = next_url
+                if status not in (307, 308):
+                    method, body, content_type = "GET", None, None
+                continue
+            if status in (401, 403):
+                raise SessionExpiredError(f"HTTP {status}")
+            if status >= 400:
+                raise PortalError(f"HTTP {status}: {url}")
+            return url, html
+        raise PortalError(f"リダイレクトが多すぎます: {url}")
+
+    def probe(self, url):
+        """url に1回だけ GET し、リダイレクトを辿らずに (ステータス, Location, HTML) を返す"""
+        return self._send("GET", url)
+
+    # ポータル操作 ---------------------------------------------------------
+
+    def get_subject_rows(self, list_url):
+        """list.xhtml を取得し、全学期の授業行を返す（ViewStateも記録する）"""
+        url, html = self.request("GET", list_url)
+        rows, forms = parse_subject_rows(html, url)
+        if not rows and not has_subject_table(html):
+            raise SessionExpiredError("授業一覧テーブルが見つかりません")
+        self._forms = forms
+        self._list_url = list_url
+        self.view_state = _find_view_state(parse_html(html))
+        if self.archive is not None:
+            self.archive.record_list(html, url)
+        return rows
+
+    def get_attendance(self, button_id):
+        """授業ボタンのフォーム送信を再現し、授業ページの出席情報を返す
+
+        ViewStateが期限切れの場合は list.xhtml を取り直して1回だけ再送する。
+        """
+        for attempt in range(2):
+            form = self._forms.get(button_id)
+            if form is None:
+                raise KeyError(f"ボタンが見つかりませんでした: {button_id}")
+            fields = [(name, self.view_state if name == VIEW_STATE_NAME and self.view_state else value)
+                      for name, value in form["fields"]]
+            _, html = self.request("POST", form["action"], fields)
+            attendance_data = parse_attendance(html)
+            if attendance_data or attempt == 1:
+                if self.archive is not None:
+                    self.archive.record_subject(button_id, html)
+                return attendance_data
+            # 授業ページが返ってこなかった（ViewExpired等）→ 一覧を取り直す
+            self.get_subject_rows(self._list_url)
+        return []
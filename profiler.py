@@ -0,0 +1,126 @@
+"""フェーズごとの所要時間の記録（--profile）
+
+ブラウザ起動・セッション復元・ページ遷移・読み込み待ち・抽出・一覧への戻り等を
+区間（span）として記録し、JSON と Chrome のトレース形式（chrome://tracing /
+Perfetto で開ける）で書き出す。タイムアウトは区間の中の印（mark）として残す。
+無効時は NullProfiler を使い、何も記録しない。
+"""
+import json
+import threading
+import time
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "category", "args", "started")
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.profiler.spans.append({
+            "name": self.name,
+            "category": self.category,
+            "start": self.started - self.profiler.origin,
+            "duration": ended - self.started,
+            "thread": threading.get_native_id(),
+            "args": self.args,
+        })
+        return False
+
+
+class Profiler:
+    """区間と印を記録する"""
+
+    enabled = True
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.marks = []
+
+    def span(self, name, category="phase", **args):
+        """with profiler.span("goto", url=...): のように使う"""
+        return _Span(self, name, category, args)
+
+    def mark(self, name, **args):
+        """タイムアウト等、時間幅のない出来事を記録"""
+        self.marks.append({
+            "name": name,
+            "time": time.perf_counter() - self.origin,
+            "thread": threading.get_native_id(),
+            "args": args,
+        })
+
+    def totals(self):
+        """区間名ごとの (合計秒, 回数)。合計の大きい順"""
+        totals = {}
+        for span in self.spans:
+            total, count = totals.get(span["name"], (0.0, 0))
+            totals[span["name"]] = (total + span["duration"], count + 1)
+        return sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+
+    def summary(self, limit=5):
+        """遅いフェーズの1行要約"""
+        parts = [f"{name} {total:.2f}秒({count}回)" for name, (total, count) in self.totals()[:limit]]
+        line = "⏱️ 遅いフェーズ: " + (" / ".join(parts) or "記録なし")
+        if self.marks:
+            line += f" / タイムアウト等{len(self.marks)}件"
+        return line
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump({
+                "spans": self.spans,
+                "marks": self.marks,
+                "totals": {name: {"seconds": total, "count": count} for name, (total, count) in self.totals()},
+            }, f, ensure_ascii=False, indent=2)
+
+    def save_chrome_trace(self, path):
+        """Chrome のトレースイベント形式で保存（時間はマイクロ秒）"""
+        events = [{
+            "name": span["name"], "cat": span["category"], "ph": "X",
+            "ts": round(span["start"] * 1e6), "dur": round(span["duration"] * 1e6),
+            "pid": 1, "tid": span["thread"], "args": span["args"],
+        } for span in self.spans]
+        events.extend({
+            "name": mark["name"], "cat": "mark", "ph": "i", "s": "t",
+            "ts": round(mark["time"] * 1e6), "pid": 1, "tid": mark["thread"], "args": mark["args"],
+        } for mark in self.marks)
+        events.sort(key=lambda event: event["ts"])
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullProfiler:
+    """無効時の代わり（何も記録しない）"""
+
+    enabled = False
+
+    def span(self, name, category="phase", **args):
+        return _NULL_SPAN
+
+    def mark(self, name, **args):
+        pass
@@ -0,0 +1,121 @@
+"""ページの読み込み完了判定と、実測値に基づくタイムアウトの調整
+
+networkidle や固定の待機時間の代わりに、必要な要素（table.main_table /
+div.contents_state）が揃って件数が安定した時点で完了とする。
+タイムアウトは過去の実測値の p95 × 係数から決め、latency_stats.json に保存する。
+"""
+import json
+import os
+import time
+
+from atomic_file import atomic_write
+
+# 実測値の保存先
+LATENCY_STATS_FILE = "latency_stats.json"
+
+# フェーズごとの既定のタイムアウト（実測値が少ないうちに使う、ミリ秒）
+DEFAULT_DEADLINES_MS = {
+    "list": 8000,
+    "subject": 8000,
+}
+
+# p95 に掛ける係数と、タイムアウトの下限・上限（ミリ秒）
+DEADLINE_FACTOR = 2.0
+MIN_DEADLINE_MS = 1500
+MAX_DEADLINE_MS = 20000
+
+# 実測値をいくつ保持するか / いくつ集まったら実測値を使うか
+MAX_SAMPLES = 50
+MIN_SAMPLES = 5
+
+# 授業一覧：テーブルの行が描画され、HTMLの読み込みが終わっていれば完了
+LIST_READY_JS = """
+() => document.readyState !== "loading"
+    && document.querySelector("table.main_table tbody tr") !== null
+"""
+
+# 授業ページ：div.contents_state があり、件数が1フレーム以上変化しなければ完了
+# （HTMLの読み込みが終わっていれば件数は確定しているので即完了）
+ATTENDANCE_READY_JS = """
+() => {
+    const count = document.querySelectorAll("div.contents_state").length;
+    if (count === 0) {
+        window.__attendanceReadyCount = undefined;
+        return false;
+    }
+    if (document.readyState !== "loading") return true;
+    if (window.__attendanceReadyCount === count) return true;
+    window.__attendanceReadyCount = count;
+    return false;
+}
+"""
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """フェーズごとの所要時間を記録し、次回以降のタイムアウトを決める
+
+    保存済みの実測値は最初に使う時点で読み込む（import 時にファイルを読まないため）。
+    """
+
+    def __init__(self, path=LATENCY_STATS_FILE):
+        self.path = path
+        self._samples = None
+        self.cap_ms = None  # タイムアウトの上限（scheduler.FetchScheduler が授業ごとに設定する）
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            self._samples = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        self._samples = json.load(f)
+                except (OSError, ValueError):
+                    self._samples = {}
+        return self._samples
+
+    def record(self, phase, seconds):
+        samples = self.samples.setdefault(phase, [])
+        samples.append(round(seconds * 1000))
+        del samples[:-MAX_SAMPLES]
+
+    def deadline_ms(self, phase):
+        """p95 × 係数（実測値が少ない場合は既定値）。cap_ms があればそれを超えない"""
+        samples = self.samples.get(phase, [])
+        if len(samples) < MIN_SAMPLES:
+            deadline = DEFAULT_DEADLINES_MS.get(phase, 8000)
+        else:
+            deadline = percentile(samples, 0.95) * DEADLINE_FACTOR
+            deadline = int(min(MAX_DEADLINE_MS, max(MIN_DEADLINE_MS, deadline)))
+        if self.cap_ms is not None:
+            deadline = min(deadline, self.cap_ms)
+        return deadline
+
+    def save(self):
+        if not self.path or self._samples is None:
+            return
+        with atomic_write(self.path) as f:
+            json.dump(self.samples, f)
+
+
+def wait_until_ready(page, phase, tracker, started):
+    """phase に応じた完了条件を満たすまで待つ
+
+    started（time.perf_counter の値）からの所要時間を記録する。
+    タイムアウトした場合は待った時間も記録して次回のタイムアウトを延ばし、
+    Playwright の TimeoutError をそのまま送出する。
+    """
+    script = LIST_READY_JS if phase == "list" else ATTENDANCE_READY_JS
+    deadline = tracker.deadline_ms(phase)
+    try:
+        page.wait_for_function(script, polling="raf", timeout=deadline)
+    finally:
+        tracker.record(phase, time.perf_counter() - started)
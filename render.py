@@ -0,0 +1,241 @@
+"""出席情報の出力（端末向けの表・JSON・NDJSON・CSV）
+
+表の各列の幅や見出しは TableLayout で1回だけ計算し、文字幅は1文字ごとにキャッシュする。
+どの形式も出席情報を1件ずつ書き出すので、ジェネレーターを渡せば取得しながら出力できる。
+"""
+import csv
+import json
+from functools import lru_cache
+import unicodedata
+
+OUTPUT_FORMATS = ["table", "json", "ndjson", "csv"]
+
+# 表示する授業回の上限（通年授業は前期/後期の13回ずつ）
+MAX_DISPLAY_LESSONS = 13
+
+# 授業名の列幅（半角換算。全角15文字分）
+NAME_WIDTH = 30
+
+# 出席状況 → 記号（それ以外は未実施）
+STATUS_SYMBOLS = {'出席': '○', '欠席': '✕'}
+UNIMPLEMENTED_SYMBOL = '―'
+
+CSV_FIELDS = ["semester", "day_and_period", "subject", "lesson", "status"]
+
+
+@lru_cache(maxsize=None)
+def char_width(char):
+    """1文字の表示幅（全角=2、半角=1）"""
+    return 2 if unicodedata.east_asian_width(char) in ('F', 'W') else 1
+
+
+def display_width(text):
+    """テキストの表示幅を計算（全角=2、半角=1）"""
+    if text.isascii():
+        return len(text)
+    return sum(map(char_width, text))
+
+
+def truncate(text, available_width):
+    """available_width から "..." の分を除いた幅に収まらなければ切り詰めて "..." を付ける"""
+    limit = available_width - 6
+    if text.isascii() and len(text) <= limit:
+        return text
+    current_width = 0
+    for i, char in enumerate(text):
+        current_width += char_width(char)
+        if current_width > limit:
+            return text[:i] + "..." if i else ""
+    return text
+
+
+class TableLayout:
+    """表の列構成（最大授業回数と通年授業の表示範囲）を前もって決めておく"""
+
+    def __init__(self, max_lessons, second_semester=False):
+        self.max_lessons = min(max_lessons, MAX_DISPLAY_LESSONS)
+        self.second_semester = second_semester
+        # 「授業名」を15文字幅で配置し、16字目に全角スペース（全角換算で17字目から出席状況）
+        header = "授業名"
+        self.header = (header + " " * max(0, NAME_WIDTH - display_width(header)) + "　"
+                       + "".join(f"{i:>3}" for i in range(1, self.max_lessons + 1))
+                       + " 出席 欠席 実施 合計")
+        self.blank_cells = ["   "] * self.max_lessons
+        self.symbol_cells = {symbol: f"{symbol:>3}"
+                             for symbol in (*STATUS_SYMBOLS.values(), UNIMPLEMENTED_SYMBOL)}
+
+    @classmethod
+    def for_results(cls, results, second_semester=False):
+        return cls(max((len(data.lessons) for data in results), default=0), second_semester)
+
+    def name_cell(self, data):
+        if data.day_and_period:
+            # 曜日・時限と空白のあと、残り12文字分で授業名を表示
+            display_name = f"{data.day_and_period} {truncate(data.subject, 24)}"
+        else:
+            display_name = truncate(data.subject, NAME_WIDTH)
+        return display_name + " " * max(0, NAME_WIDTH - display_width(display_name)) + "　"
+
+    def row(self, data):
+        cells = self.blank_cells.copy()
+        # 通年授業（14回以上）は前期なら1-13回、後期なら14-26回を1-13回として表示
+        # （授業の学期が分かればそれに従う。過去の学期を表示する場合のため）
+        offset = 0
+        if len(data.lessons) > MAX_DISPLAY_LESSONS:
+            second_semester = "後期" in data.semester if data.semester else self.second_semester
+            offset = MAX_DISPLAY_LESSONS if second_semester else 0
+        for lesson in data.lessons:
+            column = lesson.number - offset
+            if 1 <= column <= self.max_lessons and (offset == 0 or lesson.number > offset):
+                symbol = STATUS_SYMBOLS.get(lesson.status, UNIMPLEMENTED_SYMBOL)
+                cells[column - 1] = self.symbol_cells[symbol]
+        implemented_count = data.attendance_count + data.absence_count  # 実施回数 = 出席 + 欠席
+        return "".join((
+            self.name_cell(data), *cells,
+            f" {data.attendance_count:>4} {data.absence_count:>4} {implemented_count:>4} {data.total_count:>4}",
+        ))
+
+
+def write_table(results, subject_count, out, second_semester=False):
+    """出席情報の一覧表と全体統計を書き出す（results は並び替え済みであること）"""
+    if not results:
+        out.write("❌ 出席情報を取得できませんでした\n")
+        return
+    layout = TableLayout.for_results(results, second_semester)
+    lines = [
+        "",
+        "=" * 100,
+        f"📊 全授業の出席情報 ({len(results)}/{subject_count}件取得成功)",
+        "=" * 100,
+        layout.header,
+        "-" * 100,
+    ]
+    lines.extend(layout.row(data) for data in results)
+    lines.append("-" * 100)
+    out.write("\n".join(lines) + "\n")
+    write_summary(results, out)
+
+
+def write_summary(results, out):
+    """全体の統計情報を書き出す"""
+    total_attendance = sum(data.attendance_count for data in results)
+    total_absence = sum(data.absence_count for data in results)
+    total_implemented = total_attendance + total_absence  # 実施回数 = 出席 + 欠席
+    total_lessons = sum(data.total_count for data in results)
+    lines = [
+        "",
+        "=" * 50,
+        "📈 全体統計",
+        "=" * 50,
+        f"総出席回数: {total_attendance}回",
+        f"総欠席回数: {total_absence}回",
+        f"総実施回数: {total_implemented}回",
+        f"総授業回数: {total_lessons}回",
+    ]
+    if total_implemented > 0:
+        lines.append(f"出席率: {(total_attendance / total_implemented) * 100:.1f}%")
+    lines.extend(["", "凡例: ○=出席, ✕=欠席, ―=未実施"])
+    out.write("\n".join(lines) + "\n")
+
+
+def as_record(data):
+    """SubjectAttendance を JSON 用の辞書にする（dataclasses.asdict と同じ形で、コピーを作らない）"""
+    return {
+        "subject": data.subject,
+        "day_and_period": data.day_and_period,
+        "semester": data.semester,
+        "lessons": [{"number": lesson.number, "status": lesson.status} for lesson in data.lessons],
+        "attendance_count": data.attendance_count,
+        "absence_count": data.absence_count,
+        "implemented_count": data.implemented_count,
+        "total_count": data.total_count,
+        "stale": data.stale,
+    }
+
+
+def write_json(results, out):
+    """JSON配列として1件ずつ書き出す"""
+    out.write("[")
+    for i, data in enumerate(results):
+        out.write(",\n  " if i else "\n  ")
+        out.write(json.dumps(as_record(data), ensure_ascii=False))
+    out.write("\n]\n")
+
+
+def write_ndjson(results, out):
+    """1行1授業のJSONとして書き出す"""
+    for data in results:
+        out.write(json.dumps(as_record(data), ensure_ascii=False) + "\n")
+        out.flush()
+
+
+def write_csv(results, out):
+    """1行1授業回のCSVとして書き出す"""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(CSV_FIELDS)
+    for data in results:
+        writer.writerows((data.semester, data.day_and_period, data.subject, lesson.number, lesson.status)
+                         for lesson in data.lessons)
+
+
+class StreamWriter:
+    """取得した授業を1件ずつすぐに書き出す（--stream）
+
+    表の場合は授業回の列を上限の13回で固定して取得順に1行ずつ表示し、
+    並び替えた一覧表と全体統計は close で最後に表示する。
+    """
+
+    def __init__(self, out, output_format="table", second_semester=False):
+        self.out = out
+        self.output_format = output_format
+        self.second_semester = second_semester
+        self.count = 0
+        self.layout = None
+        self.csv_writer = None
+
+    def write(self, data):
+        if self.output_format == "table":
+            if self.layout is None:
+                self.layout = TableLayout(MAX_DISPLAY_LESSONS, self.second_semester)
+                self.out.write(f"\n📄 取得した順に表示します\n{self.layout.header}\n")
+            self.out.write(self.layout.row(data) + "\n")
+        elif self.output_format == "json":
+            self.out.write(",\n  " if self.count else "[\n  ")
+            self.out.write(json.dumps(as_record(data), ensure_ascii=False))
+        elif self.output_format == "ndjson":
+            self.out.write(json.dumps(as_record(data), ensure_ascii=False) + "\n")
+        elif self.output_format == "csv":
+            if self.csv_writer is None:
+                self.csv_writer = csv.writer(self.out, lineterminator="\n")
+                self.csv_writer.writerow(CSV_FIELDS)
+            self.csv_writer.writerows((data.semester, data.day_and_period, data.subject, lesson.number, lesson.status)
+                                      for lesson in data.lessons)
+        else:
+            raise ValueError(f"不明な出力形式: {self.output_format}")
+        self.count += 1
+        self.out.flush()
+
+    def close(self, results, subject_count):
+        """results は並び替え済みの全件"""
+        if self.output_format == "table":
+            write_table(results, subject_count, self.out, self.second_semester)
+        elif self.output_format == "json":
+            self.out.write("\n]\n" if self.count else "[]\n")
+        elif self.output_format == "csv" and self.csv_writer is None:
+            csv.writer(self.out, lineterminator="\n").writerow(CSV_FIELDS)
+        self.out.flush()
+
+
+def write_results(results, out, output_format="table", subject_count=None, second_semester=False):
+    """output_format に応じて書き出す"""
+    if output_format == "table":
+        results = list(results)
+        write_table(results, len(results) if subject_count is None else subject_count, out, second_semester)
+    elif output_format == "json":
+        write_json(results, out)
+    elif output_format == "ndjson":
+        write_ndjson(results, out)
+    elif output_format == "csv":
+        write_csv(results, out)
+    else:
+        raise ValueError(f"不明な出力形式: {output_format}")
@@ -0,0 +1,111 @@
+"""高速プロファイル用のリクエスト遮断
+
+context.route で授業一覧・出席情報の取得に不要なリソース（画像・フォント・
+CSS・外部スクリプト等）を読み込まずに中断し、遮断した件数と推定バイト数を集計する。
+バイト数は通常実行時に記録したリソースサイズ（resource_sizes.json）から推定する。
+"""
+import json
+import os
+from urllib.parse import urlsplit
+
+from atomic_file import atomic_write
+
+# 既定で遮断するリソース種別（Playwrightの request.resource_type）
+DEFAULT_BLOCKED_TYPES = ["image", "font", "stylesheet", "media"]
+
+# 既定で通信を許可するホスト（これ以外のホストへのリクエストは遮断）
+DEFAULT_ALLOWED_HOSTS = ["myportal.osakac.ac.jp"]
+
+# リソースサイズの記録ファイル
+RESOURCE_SIZES_FILE = "resource_sizes.json"
+
+
+def load_resource_sizes(path=RESOURCE_SIZES_FILE):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+class ResourceSizeRecorder:
+    """通常実行時にレスポンスのサイズを記録する（高速プロファイルの削減量推定用）"""
+
+    def __init__(self, path=RESOURCE_SIZES_FILE):
+        self.path = path
+        self.sizes = load_resource_sizes(path)
+        self.updated = False
+
+    def attach(self, context):
+        context.on("response", self._on_response)
+
+    def _on_response(self, response):
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.sizes[response.url] = int(length)
+            self.updated = True
+
+    def save(self):
+        if not self.updated:
+            return
+        with atomic_write(self.path) as f:
+            json.dump(self.sizes, f)
+
+
+class ResourceBlocker:
+    """不要なリソースを遮断し、遮断・通過したリクエストを集計する"""
+
+    def __init__(self, blocked_types=None, allowed_hosts=None, sizes_path=RESOURCE_SIZES_FILE):
+        self.blocked_types = set(DEFAULT_BLOCKED_TYPES if blocked_types is None else blocked_types)
+        self.allowed_hosts = list(DEFAULT_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts)
+        self.known_sizes = load_resource_sizes(sizes_path)
+        self.blocked = {}          # リソース種別 → 件数
+        self.blocked_bytes = 0     # 推定削減バイト数
+        self.unknown_size_count = 0
+        self.allowed_count = 0
+        self.received_bytes = 0
+
+    def is_allowed(self, request):
+        # ページ本体（ログインのリダイレクト等を含む）は常に許可
+        if request.resource_type == "document":
+            return True
+        if request.resource_type in self.blocked_types:
+            return False
+        host = urlsplit(request.url).hostname or ""
+        return any(host == h or host.endswith("." + h) for h in self.allowed_hosts)
+
+    def attach(self, context):
+        context.route("**/*", self._handle)
+        context.on("response", self._on_response)
+
+    def _handle(self, route):
+        request = route.request
+        if self.is_allowed(request):
+            self.allowed_count += 1
+            route.fallback()
+            return
+        self.blocked[request.resource_type] = self.blocked.get(request.resource_type, 0) + 1
+        size = self.known_sizes.get(request.url)
+        if size is None:
+            self.unknown_size_count += 1
+        else:
+            self.blocked_bytes += size
+        route.abort("blockedbyclient")
+
+    def _on_response(self, response):
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.received_bytes += int(length)
+
+    def report(self):
+        """実行ごとの削減量を表示"""
+        blocked_total = sum(self.blocked.values())
+        by_type = ", ".join(f"{t}:{n}" for t, n in sorted(self.blocked.items())) or "なし"
+        print(f"⚡ 高速プロファイル: {blocked_total}件のリクエストを遮断 ({by_type}) / "
+              f"{self.allowed_count}件を許可")
+        estimate = f"約{self.blocked_bytes / 1024:.1f}KB"
+        if self.unknown_size_count:
+            estimate += f"（サイズ不明{self.unknown_size_count}件を除く）"
+        print(f"⚡ 削減量: {estimate} / 受信量: 約{self.received_bytes / 1024:.1f}KB")
@@ -0,0 +1,105 @@
+"""メモリ使用量（RSS）の最大値の計測
+
+Python 本体と、その子孫プロセス（Playwright のドライバーと Chromium）の RSS の合計を
+/proc から一定間隔で読み取り、実行中の最大値を記録する。/proc のない環境では何もしない。
+"""
+import os
+import threading
+
+PROC_DIR = "/proc"
+
+
+def read_rss_kb(pid):
+    """プロセスの現在の RSS（KB）。読めなければ 0"""
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "status"), "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def child_pids():
+    """親プロセスID → 子プロセスIDのリスト"""
+    children = {}
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC_DIR, name, "stat"), "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 2番目の項目（コマンド名）は空白や括弧を含みうるので、最後の ")" より後を読む
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(name))
+    return children
+
+
+def descendants(pid):
+    children = child_pids()
+    found = []
+    stack = list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        found.append(child)
+        stack.extend(children.get(child, []))
+    return found
+
+
+class RssMonitor:
+    """自プロセスと子孫プロセスの RSS の合計を別スレッドで測り、最大値を記録する"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.pid = os.getpid()
+        self.available = os.path.exists(os.path.join(PROC_DIR, str(self.pid), "status"))
+        self.peak_kb = 0           # 合計の最大値
+        self.peak_self_kb = 0      # そのときの Python 本体の分
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self_kb = read_rss_kb(self.pid)
+        total_kb = self_kb + sum(read_rss_kb(pid) for pid in descendants(self.pid))
+        if total_kb > self.peak_kb:
+            self.peak_kb = total_kb
+            self.peak_self_kb = self_kb
+        return total_kb
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.available:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.sample()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def peak_mb(self):
+        return self.peak_kb / 1024 if self.available else None
+
+    def report(self):
+        if not self.available:
+            return
+        others = (self.peak_kb - self.peak_self_kb) / 1024
+        print(f"🧠 最大メモリ使用量: {self.peak_mb:.1f}MB（Python {self.peak_self_kb / 1024:.1f}MB + "
+              f"ブラウザ等 {others:.1f}MB）")
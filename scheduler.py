@@ -0,0 +1,107 @@
+"""授業ごとの取得の時間管理と再試行
+
+実行全体の時間予算（budget）と授業ごとの待ち時間の上限（subject_timeout）を守りながら
+授業を取得し、失敗した授業は最後にまとめて間隔を空けて（指数バックオフ）再試行する。
+連続して失敗した場合はサーキットブレーカーを開き、それ以上ポータルにリクエストしない。
+"""
+import time
+
+
+class FetchScheduler:
+    """授業の取得順序・打ち切り・再試行を決める（1回の実行ごとに作る）"""
+
+    def __init__(self, budget=None, subject_timeout=None, retries=1, backoff=1.0, breaker_threshold=3,
+                 tracker=None):
+        self.budget = budget                    # 実行全体の時間予算（秒）。None なら無制限
+        self.subject_timeout = subject_timeout  # 授業1件の読み込み待ちの上限（秒）
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker_threshold = breaker_threshold
+        self.tracker = tracker                  # readiness.LatencyTracker（ブラウザの待ち時間に上限を掛ける）
+        self.started = None                     # 最初の run() の時刻（ログイン・一覧の読み込みは予算に含めない）
+        self.consecutive_failures = 0
+        self.breaker_open = False
+        self.attempts = {}                      # buttonId → 取得を試みた回数
+
+    @classmethod
+    def from_config(cls, config, tracker=None):
+        return cls(config.budget, config.subject_timeout, config.retries, config.backoff,
+                   config.breaker_threshold, tracker)
+
+    def remaining(self):
+        if self.budget is None:
+            return None
+        if self.started is None:
+            return self.budget
+        return self.budget - (time.perf_counter() - self.started)
+
+    def should_stop(self):
+        remaining = self.remaining()
+        return self.breaker_open or (remaining is not None and remaining <= 0)
+
+    def _cap_wait(self):
+        """次の授業の読み込み待ちを subject_timeout と残りの予算に収める"""
+        if self.tracker is None:
+            return
+        limits = [t for t in (self.subject_timeout, self.remaining()) if t is not None]
+        self.tracker.cap_ms = max(1, int(min(limits) * 1000)) if limits else None
+
+    def _record_failure(self):
+        self.consecutive_failures += 1
+        if not self.breaker_open and self.consecutive_failures >= self.breaker_threshold:
+            self.breaker_open = True
+            print(f"🛑 {self.consecutive_failures}件連続で失敗したため、これ以上の取得を中止します")
+
+    def run(self, subjects, fetch_subjects):
+        """fetch_subjects（subjects の順に結果を yield する関数）を予算内で呼び、
+        (subject_info, result) を得られた順に yield する
+
+        予算切れ・ブレーカー・再試行の上限で取得できなかった授業は最後に result=None で返す。
+        時間予算は最初に run() を呼んだ時点から数える。
+        """
+        if self.started is None:
+            self.started = time.perf_counter()
+        pending = list(subjects)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** (attempt - 1)
+                remaining = self.remaining()
+                if remaining is not None and delay >= remaining:
+                    print(f"⏰ 再試行する時間が残っていません（{len(pending)}件）")
+                    break
+                print(f"🔁 失敗した{len(pending)}件を{delay:.1f}秒後に再試行します（{attempt}/{self.retries}回目）")
+                time.sleep(delay)
+
+            failed = []
+            results = fetch_subjects(pending)
+            try:
+                for index, subject_info in enumerate(pending):
+                    if self.should_stop():
+                        if not self.breaker_open:
+                            print(f"⏰ 時間予算（{self.budget}秒）を使い切りました。残り{len(pending) - index}件は取得しません")
+                        failed.extend(pending[index:])
+                        break
+                    self._cap_wait()
+                    self.attempts[subject_info['buttonId']] = attempt + 1
+                    result = next(results, None)
+                    if result is None:
+                        self._record_failure()
+                        failed.append(subject_info)
+                        continue
+                    self.consecutive_failures = 0
+                    yield subject_info, result
+                else:
+                    # 最後の授業の後も読み進める（最後の yield の後にある所要時間の記録等を実行させる）
+                    for _ in results:
+                        pass
+            finally:
+                results.close()
+                if self.tracker is not None:
+                    self.tracker.cap_ms = None
+
+            pending = failed
+            if not pending or self.should_stop():
+                break
+
+        for subject_info in pending:
+            yield subject_info, None
@@ -0,0 +1,99 @@
+"""保存済みセッション（session.json）の読み書きと、ブラウザを起動する前の有効性の確認
+
+session.json は Playwright の storage_state 形式（cookies と origins/localStorage）で、
+一時ファイルに書いてから置き換えるので、書き込み中に中断しても壊れない。
+probe_session はクッキーの有効期限を手元で確かめたうえで、授業一覧に1回だけ
+リクエストし（同じホストへのリダイレクトは1回だけ辿る）、セッションを valid / expired / unknown に分類する。
+"""
+import http.client
+import json
+import time
+from urllib.parse import urljoin, urlsplit
+
+from atomic_file import atomic_write
+from portal_http import PortalClient, has_subject_table
+
+VALID = "valid"
+EXPIRED = "expired"
+UNKNOWN = "unknown"
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def load_storage_state(path):
+    """storage_state を読み込む。ファイルがない・壊れている場合は None"""
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or "cookies" not in state:
+        return None
+    state.setdefault("origins", [])
+    return state
+
+
+def save_storage_state(state, path):
+    """storage_state を一時ファイルに書いてから置き換える"""
+    with atomic_write(path, sync=True) as f:
+        json.dump(state, f)
+
+
+def host_cookies(state, host):
+    """host に送られるクッキー"""
+    cookies = []
+    for cookie in state.get("cookies", []):
+        domain = (cookie.get("domain") or host).lstrip(".")
+        if host == domain or host.endswith("." + domain):
+            cookies.append(cookie)
+    return cookies
+
+
+def local_expiry(state, host, now=None):
+    """クッキーの有効期限だけで判断できれば (EXPIRED, 理由)、できなければ None"""
+    now = now or time.time()
+    cookies = host_cookies(state, host)
+    if not cookies:
+        return EXPIRED, f"{host} のクッキーがありません"
+    if all(cookie.get("expires", -1) not in (None, -1) and cookie["expires"] < now for cookie in cookies):
+        return EXPIRED, "クッキーの有効期限が切れています"
+    return None
+
+
+def probe_session(path, list_url, timeout=3, network=True, throttle=None):
+    """保存済みセッションを (VALID / EXPIRED / UNKNOWN, 理由) に分類する
+
+    network=False ならクッキーの有効期限だけを確かめる（判断できなければ UNKNOWN）。
+    throttle は各リクエストの前に呼ばれる（PortalClient と同じ、batch.py のレート制限）。
+    """
+    state = load_storage_state(path)
+    if state is None:
+        return EXPIRED, f"{path} がないか、読み込めません"
+    result = local_expiry(state, urlsplit(list_url).hostname or "")
+    if result is not None:
+        return result
+    if not network:
+        return UNKNOWN, "クッキーの有効期限内です（未確認）"
+
+    url = list_url
+    try:
+        with PortalClient(state["cookies"], timeout=timeout, throttle=throttle) as client:
+            status, location, html = client.probe(url)
+            # 同じホストへのリダイレクト（http→https 等）は1回だけ辿る（PortalClient.request と同じ判断）
+            if status in REDIRECT_STATUSES and location:
+                next_url = urljoin(url, location)
+                if urlsplit(next_url).netloc == urlsplit(url).netloc:
+                    url = next_url
+                    status, location, html = client.probe(url)
+    except (OSError, http.client.HTTPException) as e:
+        return UNKNOWN, f"接続できません: {str(e)}"
+    if status in REDIRECT_STATUSES:
+        next_url = urljoin(url, location or "")
+        if urlsplit(next_url).netloc != urlsplit(url).netloc:
+            return EXPIRED, f"ログインページにリダイレクトされました: {next_url}"
+        return UNKNOWN, f"リダイレクトが続きます: {next_url}"
+    if status in (401, 403):
+        return EXPIRED, f"HTTP {status}"
+    if status == 200 and has_subject_table(html):
+        return VALID, "授業一覧を取得できました"
+    return UNKNOWN, f"HTTP {status}"
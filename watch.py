@@ -0,0 +1,190 @@
+"""監視モード：授業時間が終わった授業だけを取得し、新しく付いた出席・欠席を通知する
+
+    python watch.py --engine http --grace-minutes 15
+    python watch.py --hook "python notify.py" --format ndjson
+    python watch.py --once     # cron から呼ぶ場合（取得が必要な授業だけ取得して終了）
+
+各授業の曜日・時限（dayAndPeriod）と時限ごとの終了時刻から次に取得する時刻を決め、
+それまで待つ。取得するのは前回の取得以降に授業時間（猶予込み）が終わった授業だけで、
+保存済みの出席情報（watch.db）と比べて「―」から出席・欠席に変わった授業回を通知する。
+初めて取得した授業は基準として保存するだけで通知しない。
+比較の基準は main.py の保存先（attendance.db）とは分けている（同じディレクトリで main.py を
+実行しても、先に取得された出席・欠席が基準に入って通知されなくなることがないように）。
+通知は標準出力（--format ndjson なら1行1件のJSON）と、--hook のコマンドの標準入力（JSON配列）に送る。
+"""
+import argparse
+import contextlib
+import json
+import shlex
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import main
+from attendance_store import AttendanceStore, is_due, next_slot_end
+from daemon import BrowserBackend, HttpBackend
+from portal_http import SessionExpiredError
+
+# 通知する出席状況
+NOTIFY_STATUSES = ("出席", "欠席")
+
+# 比較の基準にする出席情報の保存先（main.py の attendance.db とは別）
+WATCH_STORE_FILE = "watch.db"
+
+# 授業一覧を取得できなかった場合に再試行するまでの時間
+ERROR_RETRY_INTERVAL = timedelta(minutes=5)
+
+
+def diff_lessons(previous, lessons):
+    """保存済みの出席情報（store.load の形式）から、新しく出席・欠席が付いた授業回を返す"""
+    before = {int(data['lesson']): data['status'] for data in previous}
+    return [(lesson, before.get(lesson.number)) for lesson in lessons
+            if lesson.status in NOTIFY_STATUSES and before.get(lesson.number) != lesson.status]
+
+
+def next_poll(subject_list, now, grace):
+    """次に取得する時刻（いずれかの授業の終了時刻＋猶予）。曜日・時限のある授業がなければ None"""
+    ends = [next_slot_end(subject_info.get('dayAndPeriod', ''), now, grace) for subject_info in subject_list]
+    return min((end for end in ends if end is not None), default=None)
+
+
+class AttendanceWatcher:
+    """取得が必要な授業の選択・取得・差分の通知"""
+
+    def __init__(self, backend, store, grace=timedelta(minutes=10), hook=None, output_format="table", out=None):
+        self.backend = backend
+        self.store = store
+        self.grace = grace
+        self.hook = shlex.split(hook) if hook else None
+        self.output_format = output_format
+        self.out = out or sys.stdout
+        self.subject_list = []
+
+    def due_subjects(self, subject_list, now):
+        """前回の取得以降に授業時間が終わった授業（未取得の授業を含む）"""
+        return [subject_info for subject_info in subject_list
+                if is_due(subject_info.get('dayAndPeriod', ''),
+                          self.store.fetched_at(subject_info['semester'], subject_info['subject']),
+                          now, grace=self.grace)]
+
+    def poll(self, now=None):
+        """授業一覧を取得し、取得が必要な授業だけを取得して変化を通知する。通知した件数を返す"""
+        now = now or datetime.now()
+        try:
+            # open() が途中で失敗した場合も close() で起動済みの分を片付ける
+            self.backend.open()
+            self.subject_list = self.backend.list_subjects()
+            due = self.due_subjects(self.subject_list, now)
+            print(f"🔎 取得が必要な授業: {len(due)}/{len(self.subject_list)}件")
+            if not due:
+                return 0
+            results = self.backend.fetch(due)
+        finally:
+            self.backend.close()
+
+        changes = []
+        for subject_info, result in zip(due, results):
+            if not result:
+                print(f"⚠️ {subject_info['subject']}: 取得できませんでした（次の授業後に再取得します）")
+                continue
+            previous = self.store.load(subject_info['semester'], subject_info['subject'])
+            self.store.save(subject_info, result.lessons)
+            if previous is None:
+                print(f"📥 {subject_info['subject']}: 初回の取得のため基準として保存しました")
+                continue
+            changes.extend({
+                "semester": result.semester,
+                "subject": result.subject,
+                "day_and_period": result.day_and_period,
+                "lesson": lesson.number,
+                "status": lesson.status,
+                "previous": old,
+            } for lesson, old in diff_lessons(previous, result.lessons))
+        self.notify(changes)
+        return len(changes)
+
+    def notify(self, changes):
+        if not changes:
+            print("✅ 新しい出席・欠席はありません")
+            return
+        for change in changes:
+            if self.output_format == "ndjson":
+                self.out.write(json.dumps(change, ensure_ascii=False) + "\n")
+            else:
+                where = f"{change['day_and_period']} " if change['day_and_period'] else ""
+                self.out.write(f"🔔 {where}{change['subject']} 第{change['lesson']}回: {change['status']}\n")
+        self.out.flush()
+        if self.hook:
+            try:
+                subprocess.run(self.hook, input=json.dumps(changes, ensure_ascii=False), text=True,
+                               timeout=60, check=True)
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"⚠️ 通知コマンドの実行に失敗しました: {str(e)}")
+
+    def run(self, once=False):
+        """poll を繰り返す（once なら1回だけ）。once で取得に失敗した場合は False を返す
+
+        ポータルのエラーや通信エラー等ではログを出して監視を続ける（取得できなかった授業は
+        取得日時が更新されないので、次の取得で再び対象になる）。セッション切れはそのまま送出する。
+        """
+        while True:
+            failed = False
+            try:
+                self.poll()
+            except SessionExpiredError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 取得中にエラーが発生しました: {type(e).__name__}: {str(e)}")
+                failed = True
+            if once:
+                return not failed
+            now = datetime.now()
+            wake = next_poll(self.subject_list, now, self.grace)
+            if wake is None:
+                if not failed:
+                    print("⚠️ 曜日・時限のある授業がないため監視を終了します")
+                    return True
+                # 授業一覧をまだ取得できていない
+                wake = now + ERROR_RETRY_INTERVAL
+            print(f"💤 次の取得: {wake:%m/%d %H:%M}")
+            time.sleep(max(0.0, (wake - now).total_seconds()))
+
+
+def watch(args, out):
+    config = main.FetchConfig(**main.fetch_options(args), store_path=args.store, interactive=False)
+    backend = HttpBackend(config) if config.engine == "http" else BrowserBackend(config)
+    with AttendanceStore(config.store_path) as store:
+        watcher = AttendanceWatcher(backend, store, timedelta(minutes=args.grace_minutes), args.hook,
+                                    args.format, out)
+        try:
+            if not watcher.run(args.once):
+                return 1
+        except SessionExpiredError as e:
+            print(f"❌ セッションが無効です: {str(e)}")
+            return 1
+        except KeyboardInterrupt:
+            print("\n✅ 監視モードを終了しました")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OECU 出席情報の監視モード（授業時間の終わった授業だけを取得して通知）")
+    main.add_fetch_arguments(parser)
+    parser.add_argument("--store", default=WATCH_STORE_FILE,
+                        help="出席情報の保存先（SQLite、変化の比較の基準）")
+    parser.add_argument("--format", choices=["table", "ndjson"], default="table",
+                        help="通知の出力形式（table: 端末向け、ndjson: 1行1件のJSON）")
+    parser.add_argument("--grace-minutes", type=float, default=10,
+                        help="授業の終了からポータルに反映されるまで待つ時間（分）")
+    parser.add_argument("--hook", default=None,
+                        help="変化があったときに実行するコマンド（変化をJSON配列で標準入力に渡す）")
+    parser.add_argument("--once", action="store_true",
+                        help="1回だけ取得して終了する（cron から呼ぶ場合）")
+    args = parser.parse_args()
+
+    # ndjson の場合は通知だけを標準出力に出し、進捗は標準エラーに回す
+    if args.format == "ndjson":
+        with contextlib.redirect_stdout(sys.stderr):
+            exit(watch(args, sys.__stdout__))
+    exit(watch(args, sys.stdout))